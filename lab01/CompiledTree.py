@@ -0,0 +1,324 @@
+from typing import Dict, Iterator, List
+
+import numpy as np
+from PointSet import FeaturesTypes
+
+LEAF = -1
+
+class CompiledTree:
+    """A trained decision Tree flattened into parallel arrays
+
+    The nodes are numbered in depth-first order, the root being the
+    node 0. For the node `i`:
+
+    Attributes
+    ----------
+        feature : np.array[int]
+            `feature[i]` is the ID of the feature along which the node
+            splits, or LEAF if it is a leaf.
+        kind : np.array[int]
+            `kind[i]` is the value of the FeaturesTypes of this feature,
+            or LEAF.
+        threshold : np.array[float]
+            `threshold[i]` is the category (CLASSES) or the threshold
+            (REAL) of the split, and NaN for boolean splits and leaves.
+        left : np.array[int]
+            `left[i]` is the node to which the points going to the first
+            child are sent: the points with the boolean feature equal to
+            0, with the category equal to `threshold[i]` (or among the
+            categories of the node) or with the continuous feature
+            lower than `threshold[i]`.
+        right : np.array[int]
+            `right[i]` is the node receiving the other points.
+        value : np.array[bool]
+            `value[i]` is the decision of the node if it is a leaf, and
+            its majority decision otherwise, used when the tree is cut
+            above its leaves.
+        categories : np.array[float]
+            The categories of all the subset splits, one run per node.
+        category_offsets : np.array[int]
+            `categories[category_offsets[i]:category_offsets[i+1]]` are
+            the categories going to the first child, in increasing
+            order, if the node splits a categorial feature by subset.
+            The run is empty for all the other nodes.
+        depth : int
+            The depth of the deepest leaf.
+        types : List[FeaturesTypes]
+            The types of the features, or None if unknown.
+    """
+    def __init__(self,
+                 feature: np.ndarray,
+                 kind: np.ndarray,
+                 threshold: np.ndarray,
+                 left: np.ndarray,
+                 right: np.ndarray,
+                 value: np.ndarray,
+                 categories: np.ndarray = None,
+                 category_offsets: np.ndarray = None,
+                 depth: int = None,
+                 types: List[FeaturesTypes] = None):
+        self.feature = feature
+        self.kind = kind
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        if categories is None:
+            categories = np.zeros(0)
+            category_offsets = np.zeros(len(feature) + 1, dtype=np.int64)
+        self.categories = categories
+        self.category_offsets = category_offsets
+        self.depth = self._get_depth() if depth is None else depth
+        self.types = types
+
+    @classmethod
+    def from_tree(cls, tree: 'Tree') -> 'CompiledTree':
+        """Flatten a trained Tree
+
+        Parameters
+        ----------
+            tree : Tree
+                The root of the trained tree.
+
+        Returns
+        -------
+            CompiledTree
+                The flattened tree.
+        """
+        nodes = []
+        parents = []
+        stack = [(tree, -1, False)]
+        while stack:
+            node, parent, is_right = stack.pop()
+            nodes.append(node)
+            parents.append((parent, is_right))
+            if node.ID is not None:
+                # the first child is popped, hence numbered, first
+                stack.append((node.right_node, len(nodes) - 1, True))
+                stack.append((node.left_node, len(nodes) - 1, False))
+
+        nb_nodes = len(nodes)
+        feature = np.full(nb_nodes, LEAF, dtype=np.int32)
+        kind = np.full(nb_nodes, LEAF, dtype=np.int8)
+        threshold = np.full(nb_nodes, np.nan)
+        left = np.full(nb_nodes, LEAF, dtype=np.int32)
+        right = np.full(nb_nodes, LEAF, dtype=np.int32)
+        value = np.zeros(nb_nodes, dtype=bool)
+        categories = []
+        category_counts = np.zeros(nb_nodes + 1, dtype=np.int64)
+        for i, node in enumerate(nodes):
+            parent, is_right = parents[i]
+            if parent >= 0:
+                (right if is_right else left)[parent] = i
+            value[i] = node.decision
+            if node.ID is not None:
+                feature[i] = node.ID
+                kind[i] = node.kind.value
+                if node.threshold is not None:
+                    threshold[i] = node.threshold
+                if node.categories is not None:
+                    categories += sorted(node.categories)
+                    category_counts[i + 1] = len(node.categories)
+        return cls(feature, kind, threshold, left, right, value,
+                   np.array(categories, dtype=float), np.cumsum(category_counts),
+                   types=getattr(tree, 'types', None))
+
+    def get_memory_footprint(self) -> int:
+        """Compute the memory used by the arrays of the tree, in bytes"""
+        return sum(array.nbytes for array in (self.feature, self.kind, self.threshold,
+                                              self.left, self.right, self.value,
+                                              self.categories, self.category_offsets))
+
+    def _get_depth(self) -> int:
+        depth = np.zeros(len(self.feature), dtype=np.int32)
+        # parents are numbered before their children
+        for i in np.flatnonzero(self.feature != LEAF):
+            depth[self.left[i]] = depth[i] + 1
+            depth[self.right[i]] = depth[i] + 1
+        return int(depth.max())
+
+    def _is_in_categories(self, nodes: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Check whether each value is among the categories of its node
+
+        The sorted runs of categories of all the nodes are searched at
+        once, with one vectorized bisection step per halving of the
+        longest run.
+
+        Parameters
+        ----------
+            nodes : np.array[int]
+                The node of each value.
+            values : np.array[float]
+                The values to look up.
+
+        Returns
+        -------
+            np.array[bool]
+                True where the value is in the run of its node.
+        """
+        low = self.category_offsets[nodes]
+        high = self.category_offsets[nodes + 1]
+        end = high
+        last = max(len(self.categories) - 1, 0)
+        searching = low < high
+        while searching.any():
+            middle = (low + high)//2
+            goes_up = searching & (self.categories[np.minimum(middle, last)] < values)
+            low = np.where(goes_up, middle + 1, low)
+            high = np.where(searching & ~goes_up, middle, high)
+            searching = low < high
+        found = low < end
+        found[found] = self.categories[low[found]] == values[found]
+        return found
+
+    def iter_levels(self, features: np.ndarray, h: int = None, roots: np.ndarray = None) -> Iterator[np.ndarray]:
+        """Route a batch of points down the tree, one level at a time
+
+        All the points still at an inner node are moved down one level
+        at a time with vectorized masks, so the cost is one pass over
+        the batch per level of the tree.
+
+        Parameters
+        ----------
+            features : np.array[float]
+                2D array containing the features of the points. Each
+                line corresponds to a point.
+            h : int
+                The number of levels to go down, by default the depth
+                of the tree.
+            roots : np.array[int]
+                If not None, the arrays hold several trees (for instance
+                the trees of an ensemble, one after the other), and each
+                point goes down each of them from its root.
+
+        Yields
+        ------
+            np.array[int]
+                After each level, the node reached by each point (the
+                same array, updated in place). With `roots`, the nodes
+                reached by the first point in each tree come first, then
+                the ones of the second point, and so on.
+        """
+        features = np.asarray(features, dtype=float)
+        if roots is None:
+            nodes = np.zeros(len(features), dtype=np.int32)
+            rows = None
+        else:
+            nodes = np.tile(np.asarray(roots, dtype=np.int32), len(features))
+            rows = np.repeat(np.arange(len(features)), len(roots))
+        active = np.arange(len(nodes))
+        for _ in range(self.depth if h is None else h):
+            active = active[self.feature[nodes[active]] != LEAF]
+            if len(active) == 0:
+                yield nodes
+                continue
+            current = nodes[active]
+            values = features[active if rows is None else rows[active], self.feature[current]]
+            kind = self.kind[current]
+            if len(self.categories) == 0:
+                same_category = values == self.threshold[current]
+            else:
+                by_subset = self.category_offsets[current + 1] > self.category_offsets[current]
+                same_category = np.where(by_subset,
+                                         self._is_in_categories(current, values),
+                                         values == self.threshold[current])
+            goes_left = np.where(kind == FeaturesTypes.BOOLEAN.value,
+                                 values == 0,
+                                 np.where(kind == FeaturesTypes.CLASSES.value,
+                                          same_category,
+                                          values < self.threshold[current]))
+            nodes[active] = np.where(goes_left, self.left[current], self.right[current])
+            yield nodes
+
+    def get_leaves(self, features: np.ndarray, h: int = None, roots: np.ndarray = None) -> np.ndarray:
+        """Route a batch of points down to the leaves
+
+        Parameters
+        ----------
+            features : np.array[float]
+                2D array containing the features of the points. Each
+                line corresponds to a point.
+            h : int
+                If not None, the points stop at depth `h`.
+            roots : np.array[int]
+                If not None, the roots of the trees held by the arrays,
+                see `iter_levels`.
+
+        Returns
+        -------
+            np.array[int]
+                The leaf (or the node at depth `h`) reached by each
+                point, or (len(features), len(roots)) array of the leaf
+                reached by each point in each tree.
+        """
+        if roots is None:
+            nodes = np.zeros(len(features), dtype=np.int32)
+        else:
+            nodes = np.tile(np.asarray(roots, dtype=np.int32), len(features))
+        for nodes in self.iter_levels(features, h, roots):
+            pass
+        if roots is not None:
+            return nodes.reshape(len(features), len(roots))
+        return nodes
+
+    def decide_batch(self, features: np.ndarray, h: int = None) -> np.ndarray:
+        """Give the guessed labels of the tree to a batch of unlabeled points
+
+        Parameters
+        ----------
+            features : np.array[float]
+                2D array containing the features of the points. Each
+                line corresponds to a point.
+            h : int
+                If not None, the labels are guessed by the tree cut at
+                depth `h`.
+
+        Returns
+        -------
+            np.array[bool]
+                The label of each point, guessed by the tree.
+        """
+        return self.value[self.get_leaves(features, h)]
+
+    def decide_batch_by_height(self, features: np.ndarray, heights: List[int]) -> Dict[int, np.ndarray]:
+        """Give the guessed labels of the tree cut at several heights
+
+        The points go down the tree once, and the labels of each height
+        are read on the way.
+
+        Parameters
+        ----------
+            features : np.array[float]
+                2D array containing the features of the points. Each
+                line corresponds to a point.
+            heights : List[int]
+                The heights at which the tree is cut.
+
+        Returns
+        -------
+            Dict[int, np.array[bool]]
+                The label of each point for each height.
+        """
+        guesses = {}
+        if 0 in heights:
+            guesses[0] = np.full(len(features), self.value[0])
+        for level, nodes in enumerate(self.iter_levels(features, max(heights, default=0)), 1):
+            if level in heights:
+                guesses[level] = self.value[nodes]
+        return guesses
+
+    def decide(self, features: List[float]) -> bool:
+        """Give the guessed label of the tree to an unlabeled point
+
+        Parameters
+        ----------
+            features : List[float]
+                The features of the unlabeled point.
+
+        Returns
+        -------
+            bool
+                The label of the unlabeled point,
+                guessed by the tree
+        """
+        return bool(self.decide_batch([features])[0])
@@ -0,0 +1,158 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PointSet import FeaturesTypes
+
+class Dataset:
+    """A set of points stored as typed columns
+
+    Attributes
+    ----------
+        types : List[FeaturesTypes]
+            The types of the features.
+        columns : List[np.array]
+            One array per feature: uint8 for the boolean features,
+            integer codes for the categorial ones and float64 for the
+            continuous ones.
+        categories : Dict[int, np.array[float]]
+            For each categorial feature, the value of each code.
+        label_bits : np.array[uint8]
+            The labels of the points, packed into a bitmap.
+        nb_points : int
+            The number of points.
+    """
+    def __init__(self,
+                 columns: List[np.ndarray],
+                 categories: Dict[int, np.ndarray],
+                 label_bits: np.ndarray,
+                 nb_points: int,
+                 types: List[FeaturesTypes]):
+        self.columns = columns
+        self.categories = categories
+        self.label_bits = label_bits
+        self.nb_points = nb_points
+        self.types = types
+
+    @classmethod
+    def from_arrays(cls,
+                    features: np.ndarray,
+                    labels: np.ndarray,
+                    types: List[FeaturesTypes]) -> 'Dataset':
+        """Convert a feature matrix and a label vector into typed columns
+
+        Parameters
+        ----------
+            features : np.array[float]
+                2D array containing the features of the points. Each
+                line corresponds to a point, each column to a feature.
+            labels : np.array[bool]
+                The labels of the points.
+            types : List[FeaturesTypes]
+                The types of the features.
+
+        Returns
+        -------
+            Dataset
+                The same points, as typed columns.
+        """
+        features = np.asarray(features, dtype=float).reshape(len(labels), len(types))
+        columns = []
+        categories = {}
+        for j, feature_type in enumerate(types):
+            if feature_type == FeaturesTypes.CLASSES:
+                categories[j] = np.unique(features[:, j])
+            columns.append(cls.encode_column(feature_type, features[:, j], categories.get(j)))
+        labels = np.asarray(labels, dtype=bool)
+        return cls(columns, categories, np.packbits(labels), len(labels), types)
+
+    @staticmethod
+    def get_column_dtype(feature_type: FeaturesTypes, categories: np.ndarray = None) -> np.dtype:
+        """Choose how to store a feature
+
+        Parameters
+        ----------
+            feature_type : FeaturesTypes
+                The type of the feature.
+            categories : np.array[float]
+                The sorted values of a categorial feature.
+
+        Returns
+        -------
+            np.dtype
+                The smallest type able to store the feature.
+        """
+        if feature_type == FeaturesTypes.BOOLEAN:
+            return np.dtype(np.uint8)
+        if feature_type == FeaturesTypes.CLASSES:
+            return np.min_scalar_type(max(len(categories) - 1, 0))
+        return np.dtype(np.float64)
+
+    @classmethod
+    def encode_column(cls,
+                      feature_type: FeaturesTypes,
+                      values: np.ndarray,
+                      categories: np.ndarray = None) -> np.ndarray:
+        """Convert the values of a feature into their stored form
+
+        Parameters
+        ----------
+            feature_type : FeaturesTypes
+                The type of the feature.
+            values : np.array[float]
+                The values of the feature.
+            categories : np.array[float]
+                The sorted values of a categorial feature, which should
+                contain all of `values`.
+
+        Returns
+        -------
+            np.array
+                The column, with the type given by `get_column_dtype`.
+        """
+        dtype = cls.get_column_dtype(feature_type, categories)
+        if feature_type == FeaturesTypes.BOOLEAN:
+            return (values != 0).astype(dtype)
+        if feature_type == FeaturesTypes.CLASSES:
+            return np.searchsorted(categories, values).astype(dtype)
+        return np.ascontiguousarray(values, dtype=dtype)
+
+    @property
+    def labels(self) -> np.ndarray:
+        return np.unpackbits(self.label_bits, count=self.nb_points).astype(bool)
+
+    def get_column(self, j: int) -> np.ndarray:
+        """Get the values of one feature, as floats
+
+        The continuous features are returned without copy.
+
+        Parameters
+        ----------
+            j : int
+                The ID of the feature.
+
+        Returns
+        -------
+            np.array[float]
+                The value of the feature for each point.
+        """
+        if self.types[j] == FeaturesTypes.CLASSES:
+            return self.categories[j][self.columns[j]]
+        return self.columns[j].astype(float, copy=False)
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray, List[FeaturesTypes]]:
+        """Assemble the columns into the arrays expected by PointSet and Tree
+
+        Returns
+        -------
+            np.array[float]
+                2D array containing the features of the points, stored
+                column by column.
+            np.array[bool]
+                The labels of the points.
+            List[FeaturesTypes]
+                The types of the features.
+        """
+        features = np.empty((self.nb_points, len(self.types)), order='F')
+        for j in range(len(self.types)):
+            features[:, j] = self.get_column(j)
+        return features, self.labels, self.types
@@ -0,0 +1,380 @@
+from typing import List, Tuple
+
+import numpy as np
+from PointSet import FeaturesTypes
+from CompiledTree import CompiledTree, LEAF
+from binning import bin_thresholds
+from level_wise import get_key_layout, get_keys
+
+def _log_loss(labels: np.ndarray, scores: np.ndarray) -> float:
+    """The mean logistic loss of raw scores (log-odds) for some labels"""
+    return float(np.mean(np.logaddexp(0, scores) - labels*scores))
+
+class GradientBoostingClassifier:
+    """Gradient-boosted regression trees for the logistic loss
+
+    Each round fits a shallow regression tree to the gradients and
+    hessians of the logistic loss at the current scores (Newton boosting),
+    and adds its leaf values, shrunk by `learning_rate`, to the scores.
+
+    The features are binned once, as in the level-wise growth of Tree:
+    the continuous features into at most `max_bins` bins, the categorial
+    ones by category and the boolean ones by value. The trees grow level
+    by level, and the sums of gradients and hessians of every (node,
+    feature, bin) of a level come from two bincounts over combined keys.
+    The categorial features are split between two subsets of categories,
+    found by sorting them by ratio of gradients to hessians.
+
+    Attributes
+    ----------
+        init_score : float
+            The log-odds of the positive training points, from which
+            every score starts.
+        forest : CompiledTree
+            The nodes of all the trees, one tree after the other. The
+            `value` of a node is unused.
+        roots : np.array[int]
+            The root of each tree in `forest`.
+        leaf_values : np.array[float]
+            The value added to the score by each leaf of `forest`,
+            learning rate included (0 for the inner nodes).
+        train_losses : List[float]
+            The mean logistic loss of the training points after each
+            round.
+        validation_losses : List[float]
+            The mean logistic loss of the validation points after each
+            round, if early stopping is enabled.
+        best_round : int
+            The number of trees kept.
+    """
+    def __init__(self,
+                 features: List[List[float]],
+                 labels: List[bool],
+                 types: List[FeaturesTypes],
+                 nb_trees: int = 100,
+                 h: int = 3,
+                 learning_rate: float = .1,
+                 min_split_points: int = 1,
+                 max_bins: int = 255,
+                 l2_regularization: float = 1.,
+                 subsample: float = 1.,
+                 validation_fraction: float = None,
+                 early_stopping_rounds: int = 10,
+                 random_state: int = None):
+        """
+        Parameters
+        ----------
+            features : List[List[float]]
+                The features of the training points. Each sublist
+                represents a single point.
+            labels : List[bool]
+                The labels of the training points.
+            types : List[FeaturesTypes]
+                The types of the features.
+            nb_trees : int
+                The maximum number of boosting rounds.
+            h : int
+                The maximum height of each tree.
+            learning_rate : float
+                The shrinkage of the leaf values.
+            min_split_points : int
+                The minimum number of points of each child of a split.
+            max_bins : int
+                The maximum number of bins of the continuous features.
+            l2_regularization : float
+                Added to the sum of hessians of each node, it shrinks the
+                leaf values of the small nodes. It must be positive.
+            subsample : float
+                The proportion of the training points drawn (without
+                replacement) to fit each tree.
+            validation_fraction : float
+                If not None, this proportion of the points (at least
+                one, but not all of them) is held out to stop the
+                boosting once the validation loss did not improve for
+                `early_stopping_rounds` rounds; the trees of the best
+                round are kept.
+            early_stopping_rounds : int
+                The patience of the early stopping.
+            random_state : int
+                The seed of the validation split and of the subsamples.
+        """
+        if l2_regularization <= 0:
+            raise ValueError(f'l2_regularization must be positive, got {l2_regularization}')
+        features = np.asarray(features, dtype=float, order='F').reshape((len(labels), len(types)), order='F')
+        labels = np.asarray(labels, dtype=bool)
+        rng = np.random.default_rng(random_state)
+        self.types = types
+        self.h = h
+        self.learning_rate = learning_rate
+        self.min_split_points = min_split_points
+        self.l2_regularization = l2_regularization
+
+        training_rows = np.arange(len(labels))
+        validation_rows = None
+        if validation_fraction is not None:
+            order = rng.permutation(len(labels))
+            nb_validation = int(len(labels)*validation_fraction)
+            if not 0 < nb_validation < len(labels):
+                raise ValueError(f'A validation fraction of {validation_fraction} leaves {nb_validation} '
+                                 f'of the {len(labels)} points for validation')
+            validation_rows = np.sort(order[:nb_validation])
+            training_rows = np.sort(order[nb_validation:])
+
+        self.categories = {j: np.unique(features[training_rows, j]) for j, feature_type in enumerate(types)
+                           if feature_type == FeaturesTypes.CLASSES}
+        self.edges = {j: bin_thresholds(features[training_rows, j], max_bins) for j, feature_type in enumerate(types)
+                      if feature_type == FeaturesTypes.REAL}
+        self.discrete, self.nb_slots, self.offsets = get_key_layout(types, self.categories, self.edges)
+        self.nb_keys = int(self.nb_slots.sum())
+        keys = get_keys(features, training_rows, types, self.discrete, self.offsets, self.categories, self.edges)
+
+        training_features = features[training_rows]
+        y = labels[training_rows].astype(float)
+        positive_rate = np.clip(y.mean(), 1e-12, 1 - 1e-12)
+        self.init_score = float(np.log(positive_rate/(1 - positive_rate)))
+        scores = np.full(len(y), self.init_score)
+        if validation_rows is not None:
+            validation_features = features[validation_rows]
+            validation_labels = labels[validation_rows].astype(float)
+            validation_scores = np.full(len(validation_rows), self.init_score)
+
+        trees = []
+        self.train_losses = []
+        self.validation_losses = []
+        self.best_round = 0
+        for _ in range(nb_trees):
+            probabilities = 1/(1 + np.exp(-scores))
+            gradients = probabilities - y
+            hessians = probabilities*(1 - probabilities)
+            rows = np.arange(len(y))
+            if subsample < 1:
+                rows = np.sort(rng.choice(len(y), max(1, int(len(y)*subsample)), replace=False))
+            tree, leaf_values = self._fit_tree(keys, rows, gradients, hessians)
+            trees.append((tree, leaf_values))
+            scores += leaf_values[tree.get_leaves(training_features)]
+            self.train_losses.append(_log_loss(y, scores))
+            if validation_rows is None:
+                self.best_round = len(trees)
+                continue
+            validation_scores += leaf_values[tree.get_leaves(validation_features)]
+            self.validation_losses.append(_log_loss(validation_labels, validation_scores))
+            if self.validation_losses[-1] < min(self.validation_losses[:-1], default=np.inf):
+                self.best_round = len(trees)
+            elif len(trees) - self.best_round >= early_stopping_rounds:
+                break
+        self._set_forest(trees[:self.best_round])
+
+    def _fit_tree(self,
+                  keys: np.ndarray,
+                  rows: np.ndarray,
+                  gradients: np.ndarray,
+                  hessians: np.ndarray) -> Tuple[CompiledTree, np.ndarray]:
+        """Fit a regression tree to the gradients and hessians of the points at `rows`
+
+        Returns
+        -------
+            CompiledTree
+                The tree, its nodes numbered level by level.
+            np.array[float]
+                The value of each leaf, shrunk by the learning rate (0
+                for the inner nodes).
+        """
+        l2 = self.l2_regularization
+        msp = self.min_split_points
+        feature, kind, threshold, left, right, values = [], [], [], [], [], []
+        categories, category_counts = [], [0]
+        level_nodes = np.zeros(1, dtype=np.int64)
+        node_of_row = np.zeros(len(rows), dtype=np.int64)
+        positions = np.arange(len(rows))
+        for depth in range(self.h + 1):
+            nb_nodes = len(level_nodes)
+            nodes = node_of_row[positions]
+            point_rows = rows[positions]
+            node_gradients = np.bincount(nodes, gradients[point_rows], nb_nodes)
+            node_hessians = np.bincount(nodes, hessians[point_rows], nb_nodes)
+            node_counts = np.bincount(nodes, minlength=nb_nodes)
+            for i in range(nb_nodes):
+                feature.append(LEAF)
+                kind.append(LEAF)
+                threshold.append(np.nan)
+                left.append(LEAF)
+                right.append(LEAF)
+                values.append(-self.learning_rate*node_gradients[i]/(node_hessians[i] + l2))
+                category_counts.append(0)
+            if depth == self.h or self.nb_keys == 0:
+                break
+
+            # the sums of gradients and hessians of every (node, key) of the level
+            node_keys = nodes[:, None]*self.nb_keys + keys[point_rows]
+            shape = node_keys.shape
+            key_gradients = np.bincount(node_keys.ravel(), np.broadcast_to(gradients[point_rows, None], shape).ravel(),
+                                        nb_nodes*self.nb_keys).reshape(nb_nodes, -1)
+            key_hessians = np.bincount(node_keys.ravel(), np.broadcast_to(hessians[point_rows, None], shape).ravel(),
+                                       nb_nodes*self.nb_keys).reshape(nb_nodes, -1)
+            key_counts = np.bincount(node_keys.ravel(), minlength=nb_nodes*self.nb_keys).reshape(nb_nodes, -1)
+            parent_score = node_gradients**2/(node_hessians + l2)
+
+            gains = np.full((nb_nodes, len(self.discrete)), -np.inf)
+            # the keys going to the first child of the best split of each node along each feature
+            goes_left = np.zeros((len(self.discrete), nb_nodes, self.nb_keys), dtype=bool)
+            for d, j in enumerate(self.discrete):
+                slots = slice(self.offsets[d], self.offsets[d] + self.nb_slots[d])
+                slot_gradients = key_gradients[:, slots]
+                slot_hessians = key_hessians[:, slots]
+                slot_counts = key_counts[:, slots]
+                nb_slots = self.nb_slots[d]
+                if nb_slots < 2:
+                    continue
+                if self.types[j] == FeaturesTypes.CLASSES:
+                    # the best subsets are prefixes of the categories sorted by ratio
+                    ratios = np.where(slot_counts > 0, slot_gradients/np.maximum(slot_hessians, 1e-300), np.inf)
+                    order = np.argsort(ratios, axis=1, kind='stable')
+                else:
+                    order = np.broadcast_to(np.arange(nb_slots), (nb_nodes, nb_slots))
+                left_gradients = np.cumsum(np.take_along_axis(slot_gradients, order, axis=1), axis=1)[:, :-1]
+                left_hessians = np.cumsum(np.take_along_axis(slot_hessians, order, axis=1), axis=1)[:, :-1]
+                left_counts = np.cumsum(np.take_along_axis(slot_counts, order, axis=1), axis=1)[:, :-1]
+                right_gradients = node_gradients[:, None] - left_gradients
+                right_hessians = node_hessians[:, None] - left_hessians
+                right_counts = node_counts[:, None] - left_counts
+                split_gains = (left_gradients**2/(left_hessians + l2) + right_gradients**2/(right_hessians + l2)
+                               - parent_score[:, None])/2
+                split_gains[(left_counts < msp) | (right_counts < msp)] = -np.inf
+                best = np.argmax(split_gains, axis=1)
+                gains[:, d] = split_gains[np.arange(nb_nodes), best]
+                is_left = np.zeros((nb_nodes, nb_slots), dtype=bool)
+                np.put_along_axis(is_left, order, np.arange(nb_slots) <= best[:, None], axis=1)
+                goes_left[d, :, slots] = is_left
+
+            best_features = np.argmax(gains, axis=1)
+            is_split = gains[np.arange(nb_nodes), best_features] > 0
+            if not is_split.any():
+                break
+            split_nodes = np.flatnonzero(is_split)
+            next_nodes = len(feature) + np.arange(2*len(split_nodes))
+            for k, i in enumerate(split_nodes):
+                d = best_features[i]
+                j = self.discrete[d]
+                node = level_nodes[i]
+                feature[node] = j
+                kind[node] = self.types[j].value
+                left[node] = next_nodes[2*k]
+                right[node] = next_nodes[2*k + 1]
+                values[node] = 0.
+                is_left = goes_left[d, i, self.offsets[d]:self.offsets[d] + self.nb_slots[d]]
+                if self.types[j] == FeaturesTypes.CLASSES:
+                    left_categories = self.categories[j][is_left]
+                    categories.append(left_categories)
+                    category_counts[node + 1] = len(left_categories)
+                elif self.types[j] == FeaturesTypes.REAL:
+                    # the first child holds the bins up to the last one of the prefix
+                    threshold[node] = self.edges[j][np.count_nonzero(is_left) - 1]
+
+            # send the points of the split nodes to their child
+            kept = is_split[nodes]
+            split_rank = np.cumsum(is_split) - 1
+            point_keys = keys[point_rows[kept], best_features[nodes[kept]]]
+            to_left = goes_left[best_features[nodes[kept]], nodes[kept], point_keys]
+            node_of_row[positions[kept]] = 2*split_rank[nodes[kept]] + ~to_left
+            positions = positions[kept]
+            level_nodes = next_nodes
+
+        category_offsets = np.cumsum(category_counts)
+        tree = CompiledTree(np.array(feature, dtype=np.int32), np.array(kind, dtype=np.int8),
+                            np.array(threshold, dtype=float),
+                            np.array(left, dtype=np.int32), np.array(right, dtype=np.int32),
+                            np.array(values) > 0,
+                            np.concatenate(categories) if categories else np.zeros(0), category_offsets,
+                            types=self.types)
+        return tree, np.array(values)
+
+    def _set_forest(self, trees: List[Tuple[CompiledTree, np.ndarray]]) -> None:
+        """Concatenate the nodes of the trees kept into `forest`"""
+        sizes = [len(tree.feature) for tree, _ in trees]
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int32)
+        self.roots = starts
+        parts = {'feature': [], 'kind': [], 'threshold': [], 'left': [], 'right': [], 'value': [],
+                 'categories': [], 'category_counts': []}
+        for (tree, _), start in zip(trees, starts):
+            parts['feature'].append(tree.feature)
+            parts['kind'].append(tree.kind)
+            parts['threshold'].append(tree.threshold)
+            parts['left'].append(np.where(tree.left == LEAF, LEAF, tree.left + start))
+            parts['right'].append(np.where(tree.right == LEAF, LEAF, tree.right + start))
+            parts['value'].append(tree.value)
+            parts['categories'].append(tree.categories)
+            parts['category_counts'].append(np.diff(tree.category_offsets))
+        if not trees:
+            # a forest of one leaf adding nothing to the initial score
+            self.roots = np.zeros(1, dtype=np.int32)
+            self.forest = CompiledTree(np.full(1, LEAF, dtype=np.int32), np.full(1, LEAF, dtype=np.int8),
+                                       np.full(1, np.nan), np.full(1, LEAF, dtype=np.int32),
+                                       np.full(1, LEAF, dtype=np.int32), np.zeros(1, dtype=bool),
+                                       types=self.types)
+            self.leaf_values = np.zeros(1)
+            return
+        self.forest = CompiledTree(np.concatenate(parts['feature']), np.concatenate(parts['kind']),
+                                   np.concatenate(parts['threshold']),
+                                   np.concatenate(parts['left']), np.concatenate(parts['right']),
+                                   np.concatenate(parts['value']), np.concatenate(parts['categories']),
+                                   np.concatenate(([0], np.cumsum(np.concatenate(parts['category_counts'])))),
+                                   depth=max(tree.depth for tree, _ in trees), types=self.types)
+        self.leaf_values = np.concatenate([leaf_values for _, leaf_values in trees])
+
+    def get_scores(self, features: List[List[float]]) -> np.ndarray:
+        """Compute the raw scores (log-odds) of a batch of points
+
+        Every point goes down every tree at once: the pairs of points and
+        trees move down the concatenated trees one level at a time.
+
+        Parameters
+        ----------
+            features : List[List[float]]
+                The features of the points. Each sublist represents a
+                single point.
+
+        Returns
+        -------
+            np.array[float]
+                The score of each point.
+        """
+        features = np.asarray(features, dtype=float)
+        leaves = self.forest.get_leaves(features, roots=self.roots)
+        return self.init_score + self.leaf_values[leaves].sum(axis=1)
+
+    def predict_proba(self, features: List[List[float]]) -> np.ndarray:
+        """Compute the probability of the label True for each point of a batch"""
+        return 1/(1 + np.exp(-self.get_scores(features)))
+
+    def decide_batch(self, features: List[List[float]]) -> np.ndarray:
+        """Give the guessed labels of the model to a batch of unlabeled points
+
+        Parameters
+        ----------
+            features : List[List[float]]
+                The features of the unlabeled points. Each sublist
+                represents a single point.
+
+        Returns
+        -------
+            np.array[bool]
+                The label of each point: True when its probability is at
+                least 1/2, like the ties of the leaves of a Tree.
+        """
+        return self.get_scores(features) >= 0
+
+    def decide(self, features: List[float]) -> bool:
+        """Give the guessed label of the model to an unlabeled point
+
+        Parameters
+        ----------
+            features : List[float]
+                The features of the unlabeled point.
+
+        Returns
+        -------
+            bool
+                The label of the unlabeled point,
+                guessed by the model
+        """
+        return bool(self.decide_batch([features])[0])
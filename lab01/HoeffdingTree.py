@@ -0,0 +1,386 @@
+from typing import Dict, List, Tuple
+
+import math
+
+import numpy as np
+from PointSet import FeaturesTypes, gini_from_counts, split_gains
+from binning import FeatureBins
+from CompiledTree import CompiledTree
+
+class _LeafStatistics:
+    """The label counts of the points seen by a leaf, for each feature value
+
+    Attributes
+    ----------
+        nb_points : int
+            The number of points counted.
+        nb_positives : int
+            The number of points labeled True counted.
+        counts : List
+            For each feature, the number of points and of positive
+            points per value: a (2, 2) array indexed by [value != 0,
+            label] for a boolean feature, a dict mapping each category
+            (in order of first appearance) to [points, positives] for a
+            categorial one, and a (nb_bins, 2) array indexed by [bin,
+            label] for a continuous one.
+        lowest : Dict[int, np.array[float]]
+            For each continuous feature, the smallest value seen in each
+            bin.
+        highest : Dict[int, np.array[float]]
+            Likewise, the largest value seen in each bin.
+    """
+    __slots__ = ('nb_points', 'nb_positives', 'counts', 'lowest', 'highest')
+
+    def __init__(self, types: List[FeaturesTypes], bins: Dict[int, FeatureBins]):
+        self.nb_points = 0
+        self.nb_positives = 0
+        self.counts = []
+        self.lowest = {}
+        self.highest = {}
+        for j, feature_type in enumerate(types):
+            if feature_type == FeaturesTypes.BOOLEAN:
+                self.counts.append(np.zeros((2, 2), dtype=np.int64))
+            elif feature_type == FeaturesTypes.CLASSES:
+                self.counts.append({})
+            else:
+                self.counts.append(np.zeros((bins[j].nb_bins, 2), dtype=np.int64))
+                self.lowest[j] = np.full(bins[j].nb_bins, np.inf)
+                self.highest[j] = np.full(bins[j].nb_bins, -np.inf)
+
+    def update(self,
+               types: List[FeaturesTypes],
+               bins: Dict[int, FeatureBins],
+               features: List[float],
+               label: bool) -> None:
+        """Count one point, in O(1) per feature (O(log nb_bins) for the continuous ones)"""
+        self.nb_points += 1
+        self.nb_positives += label
+        for j, feature_type in enumerate(types):
+            value = features[j]
+            if feature_type == FeaturesTypes.BOOLEAN:
+                self.counts[j][int(value != 0), int(label)] += 1
+            elif feature_type == FeaturesTypes.CLASSES:
+                counts = self.counts[j].setdefault(value, [0, 0])
+                counts[0] += 1
+                counts[1] += label
+            else:
+                b = np.searchsorted(bins[j].thresholds, value, side='right')
+                self.counts[j][b, int(label)] += 1
+                self.lowest[j][b] = min(self.lowest[j][b], value)
+                self.highest[j][b] = max(self.highest[j][b], value)
+
+    def get_feature_split(self,
+                          types: List[FeaturesTypes],
+                          j: int,
+                          gini: float,
+                          min_split_points: int) -> Tuple[float, float, int, int]:
+        """Compute the best Gini gain of splitting the counted points along the feature `j`
+
+        The candidates are the ones of PointSet: value 0 against the
+        others, one category against the others (in order of first
+        appearance), or between two consecutive non-empty bins.
+
+        Returns
+        -------
+            float
+                The best Gini gain, or None if no split is valid.
+            float
+                The category or threshold of the split, None for a
+                boolean feature.
+            int
+                The number of points going to the first child.
+            int
+                The number of positive points going to the first child.
+        """
+        counts = self.counts[j]
+        if types[j] == FeaturesTypes.BOOLEAN:
+            left_counts = np.array([counts[0].sum()])
+            left_positives = np.array([counts[0, 1]])
+        elif types[j] == FeaturesTypes.CLASSES:
+            if len(counts) == 0:
+                return None, None, 0, 0
+            categories = list(counts)
+            category_counts = np.array(list(counts.values()))
+            left_counts = category_counts[:, 0]
+            left_positives = category_counts[:, 1]
+        else:
+            nonempty = np.flatnonzero(counts.sum(axis=1))
+            if len(nonempty) < 2:
+                return None, None, 0, 0
+            left_counts = np.cumsum(counts.sum(axis=1))[nonempty[:-1]]
+            left_positives = np.cumsum(counts[:, 1])[nonempty[:-1]]
+
+        gains = split_gains(gini, left_counts, left_positives, self.nb_points, self.nb_positives, min_split_points)
+        best = np.argmax(gains)
+        if gains[best] == -np.inf:
+            return None, None, 0, 0
+        if types[j] == FeaturesTypes.BOOLEAN:
+            split = None
+        elif types[j] == FeaturesTypes.CLASSES:
+            split = categories[best]
+        else:
+            split = (self.highest[j][nonempty[best]] + self.lowest[j][nonempty[best + 1]])/2
+        return gains[best], split, int(left_counts[best]), int(left_positives[best])
+
+class _Node:
+    """A node of a HoeffdingTree
+
+    It has the attributes of a Tree node read by `CompiledTree.from_tree`,
+    plus the statistics of the points seen while it is a leaf.
+    """
+    __slots__ = ('ID', 'kind', 'threshold', 'categories', 'left_node', 'right_node', 'decision',
+                 'depth', 'nb_points', 'nb_positives', 'statistics')
+
+    def __init__(self, depth: int, nb_points: int = 0, nb_positives: int = 0):
+        self.ID = None
+        self.kind = None
+        self.threshold = None
+        self.categories = None
+        self.left_node = None
+        self.right_node = None
+        self.depth = depth
+        self.nb_points = nb_points
+        self.nb_positives = nb_positives
+        self.decision = nb_positives >= nb_points - nb_positives
+        self.statistics = None
+
+class HoeffdingTree:
+    """A decision tree learned incrementally from a stream of points
+
+    Each leaf keeps the label counts of the points it has seen, per
+    boolean value, per category and per bin of each continuous feature,
+    so its memory does not grow with the stream. Every `grace_period`
+    points, a leaf computes the Gini gain of its best split along each
+    feature, and splits if the best feature beats the second one by
+    more than the Hoeffding bound: with probability `1 - delta`, the
+    split is then the one a Tree would choose with infinitely many
+    points (Domingos and Hulten, 2000).
+
+    Attributes
+    ----------
+        types : List[FeaturesTypes]
+            The types of the features.
+        bins : Dict[int, FeatureBins]
+            The bins of each continuous feature, or None until they are
+            computed from the first points of the stream.
+        root : _Node
+            The root of the tree.
+        nb_points : int
+            The number of points learned.
+    """
+    # the Gini gain of a split of binary labels is at most 1/2
+    GAIN_RANGE = .5
+
+    def __init__(self,
+                 types: List[FeaturesTypes],
+                 h: int = None,
+                 min_split_points: int = 1,
+                 grace_period: int = 200,
+                 delta: float = 1e-7,
+                 tie_threshold: float = .05,
+                 max_bins: int = 32,
+                 bins: Dict[int, FeatureBins] = None):
+        """
+        Parameters
+        ----------
+            types : List[FeaturesTypes]
+                The types of the features.
+            h : int
+                The maximum height of the tree, or None.
+            min_split_points : int
+                The minimum number of points (seen by a leaf) each side
+                of a split should contain.
+            grace_period : int
+                The number of points a leaf sees between two attempts to
+                split.
+            delta : float
+                The probability of choosing a worse split than the best
+                one.
+            tie_threshold : float
+                When the Hoeffding bound falls below it, the two best
+                splits are deemed as good, and the best one is taken.
+            max_bins : int
+                The maximum number of bins of each continuous feature.
+            bins : Dict[int, FeatureBins]
+                The bins of the continuous features. If None, they are
+                computed from the first `grace_period` points, which
+                are replayed once the bins are known.
+        """
+        self.types = types
+        self.h = h
+        self.min_split_points = min_split_points
+        self.grace_period = grace_period
+        self.delta = delta
+        self.tie_threshold = tie_threshold
+        self.max_bins = max_bins
+        self.bins = bins
+        if bins is None and FeaturesTypes.REAL not in types:
+            self.bins = {}
+        self.root = _Node(0)
+        self.nb_points = 0
+        self._buffer = []
+        if self.bins is not None:
+            self.root.statistics = _LeafStatistics(types, self.bins)
+
+    def _get_leaf(self, features: List[float]) -> _Node:
+        node = self.root
+        while node.ID is not None:
+            value = features[node.ID]
+            if node.kind == FeaturesTypes.BOOLEAN:
+                goes_left = value == 0
+            elif node.kind == FeaturesTypes.CLASSES:
+                goes_left = value == node.threshold
+            else:
+                goes_left = value < node.threshold
+            node = node.left_node if goes_left else node.right_node
+        return node
+
+    def learn_one(self, features: List[float], label: bool) -> None:
+        """Update the tree with one labeled point
+
+        Parameters
+        ----------
+            features : List[float]
+                The features of the point.
+            label : bool
+                The label of the point.
+        """
+        label = bool(label)
+        self.nb_points += 1
+        if self.bins is None:
+            # the root answers from its label counts until the bins are known
+            self._buffer.append((features, label))
+            self.root.nb_points += 1
+            self.root.nb_positives += label
+            self.root.decision = self.root.nb_positives >= self.root.nb_points - self.root.nb_positives
+            if len(self._buffer) >= self.grace_period:
+                self._start_statistics()
+            return
+        self._learn(features, label)
+
+    def _start_statistics(self) -> None:
+        """Compute the bins from the buffered points, and count these points"""
+        values = np.array([features for features, _ in self._buffer], dtype=float)
+        self.bins = {j: FeatureBins(values[:, j], self.max_bins)
+                     for j, feature_type in enumerate(self.types) if feature_type == FeaturesTypes.REAL}
+        buffer, self._buffer = self._buffer, []
+        self.root = _Node(0)
+        self.root.statistics = _LeafStatistics(self.types, self.bins)
+        for features, label in buffer:
+            self._learn(features, label)
+
+    def _learn(self, features: List[float], label: bool) -> None:
+        leaf = self._get_leaf(features)
+        leaf.nb_points += 1
+        leaf.nb_positives += label
+        leaf.decision = leaf.nb_positives >= leaf.nb_points - leaf.nb_positives
+        leaf.statistics.update(self.types, self.bins, features, label)
+        if leaf.statistics.nb_points % self.grace_period == 0:
+            self._attempt_split(leaf)
+
+    def learn(self, features: List[List[float]], labels: List[bool]) -> None:
+        """Update the tree with a batch of labeled points, one after the other
+
+        Parameters
+        ----------
+            features : List[List[float]]
+                The features of the points. Each sublist represents a
+                single point.
+            labels : List[bool]
+                The labels of the points.
+        """
+        for point, label in zip(np.asarray(features, dtype=float).tolist(), np.asarray(labels).tolist()):
+            self.learn_one(point, label)
+
+    def get_hoeffding_bound(self, nb_points: int) -> float:
+        """Compute the largest deviation of a mean gain over `nb_points` points, with probability 1 - delta"""
+        return self.GAIN_RANGE*math.sqrt(math.log(1/self.delta)/(2*nb_points))
+
+    def _attempt_split(self, leaf: _Node) -> None:
+        """Split a leaf if its best split is significantly better than the second one"""
+        if self.h is not None and leaf.depth >= self.h:
+            return
+        statistics = leaf.statistics
+        gini = gini_from_counts(statistics.nb_points, statistics.nb_positives)
+        candidates = []
+        for j in range(len(self.types)):
+            gain, split, left_count, left_positives = statistics.get_feature_split(self.types, j, gini,
+                                                                                   self.min_split_points)
+            if gain is not None:
+                candidates.append((gain, j, split, left_count, left_positives))
+        if len(candidates) == 0:
+            return
+        # the first feature wins the ties, as in PointSet
+        candidates.sort(key=lambda candidate: -candidate[0])
+        best_gain, j, split, left_count, left_positives = candidates[0]
+        second_gain = candidates[1][0] if len(candidates) > 1 else 0
+        bound = self.get_hoeffding_bound(statistics.nb_points)
+        if best_gain <= 0 or (best_gain - second_gain <= bound and bound >= self.tie_threshold):
+            return
+
+        leaf.ID = j
+        leaf.kind = self.types[j]
+        leaf.threshold = split
+        # the children start from the label counts of the split, so that
+        # they can decide before seeing any point
+        leaf.left_node = _Node(leaf.depth + 1, left_count, left_positives)
+        leaf.right_node = _Node(leaf.depth + 1, statistics.nb_points - left_count,
+                                statistics.nb_positives - left_positives)
+        leaf.left_node.statistics = _LeafStatistics(self.types, self.bins)
+        leaf.right_node.statistics = _LeafStatistics(self.types, self.bins)
+        leaf.statistics = None
+
+    def get_nb_leaves(self) -> int:
+        nb_leaves = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.ID is None:
+                nb_leaves += 1
+            else:
+                stack += [node.left_node, node.right_node]
+        return nb_leaves
+
+    def decide(self, features: List[float]) -> bool:
+        """Give the guessed label of the tree to an unlabeled point
+
+        Parameters
+        ----------
+            features : List[float]
+                The features of the unlabeled point.
+
+        Returns
+        -------
+            bool
+                The label of the unlabeled point,
+                guessed by the tree
+        """
+        return bool(self._get_leaf(features).decision)
+
+    def compile(self) -> CompiledTree:
+        """Flatten the current tree into parallel arrays
+
+        The result is a snapshot: the decisions of the leaves keep
+        changing as points are learned, so it should be compiled again
+        to take them into account.
+        """
+        compiled = CompiledTree.from_tree(self.root)
+        compiled.types = self.types
+        return compiled
+
+    def decide_batch(self, features: List[List[float]]) -> np.ndarray:
+        """Give the guessed labels of the tree to a batch of unlabeled points
+
+        Parameters
+        ----------
+            features : List[List[float]]
+                The features of the unlabeled points. Each sublist
+                represents a single point.
+
+        Returns
+        -------
+            np.array[bool]
+                The labels of the unlabeled points,
+                guessed by the tree
+        """
+        return self.compile().decide_batch(features)
@@ -1,14 +1,76 @@
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
 from enum import Enum
+import time
 import numpy as np
 
+from binning import FeatureBins
+
 class FeaturesTypes(Enum):
     """Enumerate possible features types"""
     BOOLEAN=0
     CLASSES=1
     REAL=2
 
+def gini_from_counts(counts, positives):
+    """Computes the Gini score of sets of points from their label counts
+
+    Parameters
+    ----------
+    counts : np.array[int] or int
+        The number of points of each set.
+    positives : np.array[int] or int
+        The number of points labeled True in each set.
+
+    Returns
+    -------
+    np.array[float] or float
+        The Gini score of each set.
+    """
+    negatives = counts - positives
+    return 1 - (negatives/counts)**2 - (positives/counts)**2
+
+def split_gains(gini: float,
+                left_counts: np.ndarray,
+                left_positives: np.ndarray,
+                count: int,
+                positives: int,
+                min_split_points: int = 1) -> np.ndarray:
+    """Computes the Gini gains of candidate splits from their label counts
+
+    Parameters
+    ----------
+    gini : float
+        The Gini score of the set of points being split.
+    left_counts : np.array[int]
+        For each candidate split, the number of points going to the
+        first child.
+    left_positives : np.array[int]
+        For each candidate split, the number of points labeled True
+        going to the first child.
+    count : int
+        The number of points of the set being split.
+    positives : int
+        The number of points labeled True in the set being split.
+    min_split_points : int
+        The minimum number of points each child should contain.
+
+    Returns
+    -------
+    np.array[float]
+        The Gini gain of each candidate split, or -inf for the
+        candidates leaving an empty child or less than
+        `min_split_points` points in one of the children.
+    """
+    right_counts = count - left_counts
+    right_positives = positives - left_positives
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gini_0 = gini_from_counts(left_counts, left_positives)
+        gini_1 = gini_from_counts(right_counts, right_positives)
+        gains = gini - (gini_0*left_counts + gini_1*right_counts)/count
+    valid = (left_counts >= max(min_split_points, 1)) & (right_counts >= max(min_split_points, 1))
+    return np.where(valid, gains, -np.inf)
+
 class PointSet:
     """A class representing set of training points.
 
@@ -19,11 +81,37 @@ class PointSet:
             features of each point
         features : np.array[float]
             2D array containing the features of the points. Each line
-            corresponds to a point, each column to a feature.
+            corresponds to a point, each column to a feature. When
+            `indices` is not None, only the lines listed in `indices`
+            belong to the set.
         labels : np.array[bool]
             1D array containing the labels of the points.
+        indices : np.array[int]
+            The lines of `features` belonging to the set, or None if
+            they all do.
+        sorted_indices : Dict[int, np.array[int]]
+            For some continuous features, the lines of `features`
+            belonging to the set sorted by increasing value of the
+            feature, or None.
+        histograms : Dict[int, Tuple[FeatureBins, np.array[int], np.array[int]]]
+            For some continuous features, their quantization into bins
+            and the number of points and of positive points of the set
+            in each bin, or None.
+        classes_split : str
+            How the categorial features are split: 'one_vs_rest' (one
+            category against the others) or 'subset' (any subset of the
+            categories against the others).
+        profile : NodeProfile
+            If not None, records the features scanned and the candidate
+            splits evaluated.
     """
-    def __init__(self, features: List[List[float]], labels: List[bool], types: List[FeaturesTypes]):
+    def __init__(self,
+                 features: List[List[float]],
+                 labels: List[bool],
+                 types: List[FeaturesTypes],
+                 indices: np.ndarray = None,
+                 sorted_indices: Dict[int, np.ndarray] = None,
+                 histograms: Dict[int, Tuple[FeatureBins, np.ndarray, np.ndarray]] = None):
         """
         Parameters
         ----------
@@ -37,11 +125,39 @@ class PointSet:
             The labels of the points.
         types : List[FeaturesTypes]
             The types of the features of the points.
+        indices : np.array[int]
+            If not None, `features` and `labels` are arrays holding a
+            larger set of points, of which only the ones at these
+            indices belong to this set. The features are then shared
+            instead of being copied.
+        sorted_indices : Dict[int, np.array[int]]
+            If not None, maps some continuous features to the indices
+            of the points of the set (in `features`) sorted by
+            increasing value of the feature. The threshold search along
+            these features then does not need to sort the points.
+        histograms : Dict[int, Tuple[FeatureBins, np.array[int], np.array[int]]]
+            If not None, maps some continuous features to their
+            quantization into bins, the number of points of the set in
+            each bin and the number of positive points in each bin. The
+            thresholds along these features are then only searched
+            between bins, which is approximate but costs O(nb_bins)
+            instead of O(n). It has precedence over `sorted_indices`.
         """
         self.types = types
-        self.features = np.array(features)
-        self.labels = np.array(labels)
+        if indices is None:
+            self.features = np.array(features)
+            self.labels = np.array(labels)
+            self._all_labels = self.labels
+        else:
+            self.features = np.asarray(features)
+            self._all_labels = np.asarray(labels)
+            self.labels = self._all_labels[indices]
+        self.indices = indices
+        self.sorted_indices = sorted_indices
+        self.histograms = histograms
         self.min_split_points = 1
+        self.classes_split = 'one_vs_rest'
+        self.profile = None
     
     def get_gini(self) -> float:
         """Computes the Gini score of the set of points
@@ -51,15 +167,43 @@ class PointSet:
         float
             The Gini score of the set of points
         """
-        label_0 = sum(self.labels == False)
-        label_1 = sum(self.labels == True)
+        label_0 = np.count_nonzero(self.labels == False)
+        label_1 = np.count_nonzero(self.labels == True)
         gini = 1 - (label_0/(label_0 + label_1))**2 - (label_1/(label_0 + label_1))**2
         return gini
         # raise NotImplementedError('Please implement this function for Question 1')
 
-    def get_best_gain(self) -> Tuple[int, float]:
+    def get_column(self, j: int) -> np.ndarray:
+        """Get the values of one feature for the points of the set
+
+        Parameters
+        ----------
+        j : int
+            The ID of the feature.
+
+        Returns
+        -------
+        np.array[float]
+            The value of the feature `j` for each point of the set.
+        """
+        if self.indices is None:
+            return self.features[:, j]
+        return self.features[self.indices, j]
+
+    def get_best_gain(self,
+                      executor: 'FeatureExecutor' = None,
+                      feature_ids: List[int] = None) -> Tuple[int, float]:
         """Compute the feature along which splitting provides the best gain
 
+        Parameters
+        ----------
+        executor : FeatureExecutor
+            If not None, the features are scored concurrently by this
+            executor. The result is the same.
+        feature_ids : List[int]
+            If not None, only these features, in increasing order, are
+            considered (as in random forests).
+
         Returns
         -------
         int
@@ -74,113 +218,20 @@ class PointSet:
         self.best_split_type = None
         
         gini = self.get_gini()
-        for j in range(self.features.shape[1]):
-            if self.types[j] == FeaturesTypes.BOOLEAN:
-                features_0 = []
-                features_1 = []
-                labels_0 = []
-                labels_1 = []
-                for i in range(self.features.shape[0]):
-                    if self.features[i][j] == 0:
-                        features_0.append(self.features[i])
-                        labels_0.append(self.labels[i])
-                    else:
-                        features_1.append(self.features[i])
-                        labels_1.append(self.labels[i])
-                
-                if len(labels_0) < self.min_split_points or len(labels_1) < self.min_split_points:
-                    continue
-                    
-                pointset_0 = PointSet(features_0, labels_0, self.types)
-                pointset_1 = PointSet(features_1, labels_1, self.types)
-                gini_0 = pointset_0.get_gini()
-                gini_1 = pointset_1.get_gini()
-                gini_gain = gini - (gini_0*len(labels_0) + gini_1*len(labels_1))/len(self.labels)
-                
-                if gini_gain > best_gini_gain:
-                    best_gini_gain = gini_gain
-                    ID_best_gini_gain = j
-                    self.best_split_type = FeaturesTypes.BOOLEAN
-                    self.best_split = None
-                
-            elif self.types[j] == FeaturesTypes.CLASSES:
-                features_dict = {}
-                for i in range(self.features.shape[0]):
-                    if self.features[i][j] not in features_dict:
-                        features_dict[self.features[i][j]] = 0
-                    features_dict[self.features[i][j]] += 1
-                
-                for k in features_dict.keys():
-                    features_0 = []
-                    features_1 = []
-                    labels_0 = []
-                    labels_1 = []
-                    for i in range(self.features.shape[0]):
-                        if self.features[i][j] == k:
-                            features_0.append(self.features[i])
-                            labels_0.append(self.labels[i])
-                        else:
-                            features_1.append(self.features[i])
-                            labels_1.append(self.labels[i])
-                    
-                    if len(labels_0) < self.min_split_points or len(labels_1) < self.min_split_points:
-                        continue
-                    
-                    pointset_0 = PointSet(features_0, labels_0, self.types)
-                    pointset_1 = PointSet(features_1, labels_1, self.types)
-                    gini_0 = pointset_0.get_gini()
-                    gini_1 = pointset_1.get_gini()
-                    gini_gain = gini - (gini_0*len(labels_0) + gini_1*len(labels_1))/len(self.labels)
-                    
-                    if gini_gain > best_gini_gain:
-                        best_gini_gain = gini_gain
-                        ID_best_gini_gain = j
-                        self.best_split_type = FeaturesTypes.CLASSES
-                        self.best_split = k
-                
-            elif self.types[j] == FeaturesTypes.REAL:
-                # we use an efficient way to deal with the calculation of threshold
-                # we use a pointer to point to the position of the current threshold after sorting
-                # we will not calculate the whole list of features_0 and features_1
-                # instead, at each update of the threshold, we only need to update the number of points whose label is 0 or 1
-                # the sorting complexity is O(nlogn), but for finding the threshold it takes only O(n) which is the complexity of traversing the list
-                # so the total complexity is O(nlogn)
-                feature_label = np.column_stack((self.features, self.labels))
-                sorted_indices = np.argsort(feature_label[:, j])
-                sorted_features = feature_label[sorted_indices]
-                
-                feature_0_label_0 = 0
-                feature_0_label_1 = 0
-                feature_1_label_0 = np.sum(sorted_features[:, -1] == False)
-                feature_1_label_1 = np.sum(sorted_features[:, -1] == True)
-                
-                last_threshold_index = 0
-                for threshold_index in range(sorted_features.shape[0] - 1):
-                    if sorted_features[threshold_index][j] == sorted_features[threshold_index+1][j]:
-                        continue
-                    
-                    for i in range(last_threshold_index, threshold_index+1):
-                        if sorted_features[i][-1] == False:
-                            feature_0_label_0 += 1
-                            feature_1_label_0 -= 1
-                        else:
-                            feature_0_label_1 += 1
-                            feature_1_label_1 -= 1
-                    
-                    last_threshold_index = threshold_index + 1
-                    
-                    if feature_0_label_0 + feature_0_label_1 < self.min_split_points or feature_1_label_0 + feature_1_label_1 < self.min_split_points:
-                        continue
-                    
-                    gini_0 = 1 - (feature_0_label_0/(feature_0_label_0 + feature_0_label_1))**2 - (feature_0_label_1/(feature_0_label_0 + feature_0_label_1))**2
-                    gini_1 = 1 - (feature_1_label_0/(feature_1_label_0 + feature_1_label_1))**2 - (feature_1_label_1/(feature_1_label_0 + feature_1_label_1))**2
-                    gini_gain = gini - (gini_0*(feature_0_label_0 + feature_0_label_1) + gini_1*(feature_1_label_0 + feature_1_label_1))/len(self.labels)
-                    
-                    if gini_gain > best_gini_gain:
-                        best_gini_gain = gini_gain
-                        ID_best_gini_gain = j
-                        self.best_split_type = FeaturesTypes.REAL
-                        self.best_split = (sorted_features[threshold_index][j] + sorted_features[threshold_index+1][j])/2
+        if feature_ids is None:
+            feature_ids = range(self.features.shape[1])
+        if executor is None:
+            feature_splits = (self.get_feature_split(j, gini) for j in feature_ids)
+        else:
+            feature_splits = executor.get_feature_splits(self, gini, feature_ids)
+        for j, (gini_gain, split) in zip(feature_ids, feature_splits):
+            # strict comparison: on ties the first feature (and the first
+            # candidate split of that feature) wins
+            if gini_gain is not None and gini_gain > best_gini_gain:
+                best_gini_gain = gini_gain
+                ID_best_gini_gain = j
+                self.best_split_type = self.types[j]
+                self.best_split = split
                     
         if ID_best_gini_gain == -1:
             return None, None
@@ -189,6 +240,244 @@ class PointSet:
         
         # raise NotImplementedError('Please implement this function for Question 2')
 
+    def get_feature_split(self, j: int, gini: float) -> Tuple[float, float]:
+        """Compute the best Gini gain of splitting along the feature `j`
+
+        Parameters
+        ----------
+        j : int
+            The ID of the feature.
+        gini : float
+            The Gini score of the set of points.
+
+        Returns
+        -------
+        float
+            The best Gini gain, or None if no split is valid.
+        float
+            The category or threshold of the best split, None for a
+            boolean feature. For a subset split, the sorted array of
+            the categories going to the first child.
+        """
+        if self.profile is not None:
+            start = time.perf_counter()
+            result = self._get_feature_split(j, gini)
+            self.profile.add_feature(self.types[j], time.perf_counter() - start)
+            return result
+        return self._get_feature_split(j, gini)
+
+    def _get_feature_split(self, j: int, gini: float) -> Tuple[float, float]:
+        if self.types[j] == FeaturesTypes.BOOLEAN:
+            return self._get_boolean_split(j, gini)
+        elif self.types[j] == FeaturesTypes.CLASSES:
+            if self.classes_split == 'subset':
+                return self._get_classes_subset_split(j, gini)
+            return self._get_classes_split(j, gini)
+        return self._get_real_split(j, gini)
+
+    def _get_gains(self,
+                   feature_type: FeaturesTypes,
+                   gini: float,
+                   left_counts: np.ndarray,
+                   left_positives: np.ndarray,
+                   count: int,
+                   positives: int) -> np.ndarray:
+        """Compute the Gini gains of candidate splits, see `split_gains`"""
+        if self.profile is not None:
+            self.profile.add_candidates(feature_type, len(left_counts))
+        return split_gains(gini, left_counts, left_positives, count, positives, self.min_split_points)
+
+    def _get_boolean_split(self, j: int, gini: float) -> Tuple[float, None]:
+        """Compute the Gini gain of splitting along the boolean feature `j`
+
+        The points whose feature is 0 go to the first child, the others
+        to the second one. Only the label counts of each side are needed,
+        so no point is copied.
+
+        Returns
+        -------
+        float
+            The Gini gain of the split, or None if the split is not valid.
+        None
+            Boolean splits have no threshold.
+        """
+        labels = self.labels.astype(bool)
+        left = self.get_column(j) == 0
+        gains = self._get_gains(FeaturesTypes.BOOLEAN, gini,
+                                np.array([np.count_nonzero(left)]),
+                                np.array([np.count_nonzero(left & labels)]),
+                                len(labels), np.count_nonzero(labels))
+        if gains[0] == -np.inf:
+            return None, None
+        return gains[0], None
+
+    def _get_classes_split(self, j: int, gini: float) -> Tuple[float, float]:
+        """Compute the best Gini gain of splitting along the categorical feature `j`
+
+        Each category `k` defines a candidate split between the points
+        whose feature equals `k` and the other ones. The label counts of
+        every category are computed at once, and the candidates are
+        scanned in order of first appearance of their category.
+
+        Returns
+        -------
+        float
+            The best Gini gain, or None if no split is valid.
+        float
+            The category defining the best split.
+        """
+        labels = self.labels.astype(bool)
+        values, first_index, inverse = np.unique(self.get_column(j), return_index=True, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(values))
+        positives = np.bincount(inverse[labels], minlength=len(values))
+        
+        order = np.argsort(first_index)
+        gains = self._get_gains(FeaturesTypes.CLASSES, gini, counts[order], positives[order],
+                                len(labels), np.count_nonzero(labels))
+        best = np.argmax(gains)
+        if gains[best] == -np.inf:
+            return None, None
+        return gains[best], values[order][best]
+
+    def _get_classes_subset_split(self, j: int, gini: float) -> Tuple[float, np.ndarray]:
+        """Compute the best Gini gain of splitting the categories of the feature `j` in two subsets
+
+        For binary labels, the best partition of the categories puts
+        the ones with the lowest rates of positive points on one side
+        (Breiman et al., 1984). The categories are thus sorted by rate
+        and only the k-1 splits between consecutive ones are scanned,
+        instead of the 2^(k-1) subsets.
+
+        Returns
+        -------
+        float
+            The best Gini gain, or None if no split is valid.
+        np.array[float]
+            The categories going to the first child, in increasing order.
+        """
+        labels = self.labels.astype(bool)
+        values, inverse = np.unique(self.get_column(j), return_inverse=True)
+        if len(values) < 2:
+            return None, None
+        counts = np.bincount(inverse, minlength=len(values))
+        positives = np.bincount(inverse[labels], minlength=len(values))
+        
+        # ties between rates keep the categories in increasing order
+        order = np.argsort(positives/counts, kind='stable')
+        gains = self._get_gains(FeaturesTypes.CLASSES, gini,
+                                np.cumsum(counts[order])[:-1], np.cumsum(positives[order])[:-1],
+                                len(labels), np.count_nonzero(labels))
+        best = np.argmax(gains)
+        if gains[best] == -np.inf:
+            return None, None
+        return gains[best], np.sort(values[order[:best + 1]])
+
+    def _get_real_split(self, j: int, gini: float) -> Tuple[float, float]:
+        """Compute the best Gini gain of splitting along the continuous feature `j`
+
+        Returns
+        -------
+        float
+            The best Gini gain, or None if no split is valid.
+        float
+            The threshold defining the best split.
+        """
+        # the points are sorted once along the feature; the label counts of
+        # the first child for every threshold are then the cumulative sums of
+        # the sorted labels, so all the candidate gains are computed at once
+        # the sorting complexity is O(nlogn), the scan of the thresholds O(n)
+        # when the points come presorted, only the O(n) scan remains
+        if self.histograms is not None and j in self.histograms:
+            return self._scan_histogram(*self.histograms[j], gini)
+        if self.sorted_indices is not None and j in self.sorted_indices:
+            sorted_indices = self.sorted_indices[j]
+            return self._scan_sorted_column(self.features[sorted_indices, j],
+                                            self._all_labels[sorted_indices].astype(bool),
+                                            gini)
+        labels = self.labels.astype(bool)
+        column = self.get_column(j)
+        sorted_indices = np.argsort(column)
+        return self._scan_sorted_column(column[sorted_indices], labels[sorted_indices], gini)
+
+    def _scan_sorted_column(self, sorted_values: np.ndarray, sorted_labels: np.ndarray, gini: float) -> Tuple[float, float]:
+        """Find the best threshold of a continuous feature from its sorted values
+
+        Parameters
+        ----------
+        sorted_values : np.array[float]
+            The values of the feature for every point, in increasing order.
+        sorted_labels : np.array[bool]
+            The labels of the points, in the same order.
+        gini : float
+            The Gini score of the set of points.
+
+        Returns
+        -------
+        float
+            The best Gini gain, or None if no split is valid.
+        float
+            The threshold defining the best split, halfway between the
+            two consecutive values it separates.
+        """
+        # a threshold cannot separate two points with the same value, so the
+        # only candidates are the positions i where the value changes, each
+        # putting the points 0..i in the first child
+        candidates = np.flatnonzero(sorted_values[:-1] != sorted_values[1:])
+        if len(candidates) == 0:
+            return None, None
+        
+        cumulated_positives = np.cumsum(sorted_labels)
+        gains = self._get_gains(FeaturesTypes.REAL, gini,
+                                candidates + 1, cumulated_positives[candidates],
+                                len(sorted_labels), cumulated_positives[-1])
+        
+        best = np.argmax(gains)
+        if gains[best] == -np.inf:
+            return None, None
+        i = candidates[best]
+        return gains[best], (sorted_values[i] + sorted_values[i+1])/2
+
+    def _scan_histogram(self, bins: FeatureBins, counts: np.ndarray, positives: np.ndarray, gini: float) -> Tuple[float, float]:
+        """Find the best threshold of a continuous feature from its histogram
+
+        Parameters
+        ----------
+        bins : FeatureBins
+            The quantization of the feature.
+        counts : np.array[int]
+            The number of points of the set in each bin.
+        positives : np.array[int]
+            The number of points of the set labeled True in each bin.
+        gini : float
+            The Gini score of the set of points.
+
+        Returns
+        -------
+        float
+            The best Gini gain, or None if no split is valid.
+        float
+            The threshold defining the best split, halfway between the
+            largest training value of the last bin of the first child
+            and the smallest one of the first bin of the second child.
+        """
+        # the candidates are the boundaries between consecutive non-empty
+        # bins; when every value has its own bin this is the exact search
+        nonempty = np.flatnonzero(counts)
+        if len(nonempty) < 2:
+            return None, None
+        
+        cumulated_counts = np.cumsum(counts)
+        cumulated_positives = np.cumsum(positives)
+        candidates = nonempty[:-1]
+        gains = self._get_gains(FeaturesTypes.REAL, gini,
+                                cumulated_counts[candidates], cumulated_positives[candidates],
+                                cumulated_counts[-1], cumulated_positives[-1])
+        
+        best = np.argmax(gains)
+        if gains[best] == -np.inf:
+            return None, None
+        return gains[best], (bins.upper_values[nonempty[best]] + bins.lower_values[nonempty[best+1]])/2
+
     def get_best_threshold (self) -> float:
         if self.best_split_type==None:
             raise Exception("Bad call to get_best_threshold")
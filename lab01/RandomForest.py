@@ -0,0 +1,168 @@
+from typing import List
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PointSet import FeaturesTypes
+from Tree import Tree
+from CompiledTree import CompiledTree
+from parallel import SharedArray, attach
+
+def _train_tree(features: np.ndarray,
+                labels: np.ndarray,
+                types: List[FeaturesTypes],
+                seed: np.random.SeedSequence,
+                tree_params: dict) -> CompiledTree:
+    """Train one tree of the forest on a bootstrap sample of the points
+
+    The bootstrap sample and the feature draws only depend on `seed`,
+    so the tree does not depend on the process training it.
+    """
+    bootstrap_seed, features_seed = seed.spawn(2)
+    nb_points = len(labels)
+    sample = np.random.default_rng(bootstrap_seed).integers(0, nb_points, nb_points)
+    tree = Tree(features, labels, types, sample=sample, random_state=features_seed, **tree_params)
+    return tree.compile()
+
+def _process_train_tree(features_spec: tuple,
+                        labels_spec: tuple,
+                        types: List[FeaturesTypes],
+                        seed: np.random.SeedSequence,
+                        tree_params: dict) -> CompiledTree:
+    """Train one tree of the forest in a worker process"""
+    return _train_tree(attach(features_spec), attach(labels_spec), types, seed, tree_params)
+
+class RandomForest:
+    """A bagged ensemble of decision Trees
+
+    Each tree learns from a bootstrap sample of the training points
+    (drawn with replacement, as indices into the shared training
+    points), and each of its nodes only considers a random subset of
+    the features. The forest decides by majority vote.
+
+    Attributes
+    ----------
+        trees : List[CompiledTree]
+            The trained trees, flattened for batch prediction.
+    """
+    def __init__(self,
+                 features: List[List[float]],
+                 labels: List[bool],
+                 types: List[FeaturesTypes],
+                 nb_trees: int = 10,
+                 h: int = 1,
+                 min_split_points: int = 1,
+                 max_features: int = None,
+                 max_bins: int = None,
+                 workers: int = 1,
+                 random_state: int = None,
+                 classes_split: str = 'one_vs_rest'):
+        """
+        Parameters
+        ----------
+            features : List[List[float]]
+                The features of the training points. Each sublist
+                represents a single point.
+            labels : List[bool]
+                The labels of the training points.
+            types : List[FeaturesTypes]
+                The types of the features.
+            nb_trees : int
+                The number of trees of the forest.
+            h : int
+                The maximum height of each tree.
+            min_split_points : int
+                The minimum number of points required to split a node.
+            max_features : int
+                The number of features drawn for each node. By default,
+                the square root of the number of features.
+            max_bins : int
+                If not None, the continuous features are binned as in
+                Tree.
+            workers : int
+                If greater than 1, the trees are trained by this many
+                processes. The training points are copied once into
+                shared memory, and each task only carries a seed, so the
+                forest is the same whatever the number of workers.
+            random_state : int
+                The seed of the forest.
+            classes_split : str
+                How the categorial features are split, as in Tree.
+        """
+        features = np.asarray(features, dtype=float, order='F').reshape((len(labels), len(types)), order='F')
+        labels = np.asarray(labels, dtype=bool)
+        if max_features is None:
+            max_features = max(1, int(np.sqrt(len(types))))
+        tree_params = {'h': h, 'min_split_points': min_split_points,
+                       'max_features': max_features, 'max_bins': max_bins,
+                       'classes_split': classes_split}
+        seeds = np.random.SeedSequence(random_state).spawn(nb_trees)
+
+        if workers <= 1:
+            self.trees = [_train_tree(features, labels, types, seed, tree_params) for seed in seeds]
+            return
+        shared = [SharedArray(features, order='F'), SharedArray(labels)]
+        try:
+            with ProcessPoolExecutor(workers) as pool:
+                futures = [pool.submit(_process_train_tree, shared[0].spec, shared[1].spec,
+                                       types, seed, tree_params)
+                           for seed in seeds]
+                self.trees = [future.result() for future in futures]
+        finally:
+            for array in shared:
+                array.release()
+
+    def get_votes(self, features: List[List[float]]) -> np.ndarray:
+        """Count the trees voting True for each point of a batch
+
+        Parameters
+        ----------
+            features : List[List[float]]
+                The features of the unlabeled points. Each sublist
+                represents a single point.
+
+        Returns
+        -------
+            np.array[int]
+                The number of trees guessing the label True for each
+                point.
+        """
+        features = np.asarray(features, dtype=float)
+        votes = np.zeros(len(features), dtype=np.int32)
+        for tree in self.trees:
+            votes += tree.decide_batch(features)
+        return votes
+
+    def decide_batch(self, features: List[List[float]]) -> np.ndarray:
+        """Give the guessed labels of the forest to a batch of unlabeled points
+
+        Parameters
+        ----------
+            features : List[List[float]]
+                The features of the unlabeled points. Each sublist
+                represents a single point.
+
+        Returns
+        -------
+            np.array[bool]
+                The label of each point, guessed by the majority of the
+                trees (True on ties, like the leaves of a Tree).
+        """
+        votes = self.get_votes(features)
+        return votes >= len(self.trees) - votes
+
+    def decide(self, features: List[float]) -> bool:
+        """Give the guessed label of the forest to an unlabeled point
+
+        Parameters
+        ----------
+            features : List[float]
+                The features of the unlabeled point.
+
+        Returns
+        -------
+            bool
+                The label of the unlabeled point,
+                guessed by the forest
+        """
+        return bool(self.decide_batch([features])[0])
@@ -0,0 +1,303 @@
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from PointSet import FeaturesTypes, gini_from_counts, split_gains
+from binning import FeatureBins
+
+class FeatureStatistics:
+    """The label counts of a set of points for each value of one feature
+
+    Attributes
+    ----------
+        keys : np.array
+            The distinct values of the feature, or the distinct bins for
+            a binned continuous feature, in increasing order.
+        counts : np.array[int]
+            The number of points for each key.
+        positives : np.array[int]
+            The number of points labeled True for each key.
+        first_seen : np.array[int]
+            The index of the first point having each key, used to scan
+            the categories in the same order as PointSet.
+        lowest : np.array[float]
+            The smallest value of the feature seen for each key.
+        highest : np.array[float]
+            The largest value of the feature seen for each key.
+    """
+    def __init__(self,
+                 keys: np.ndarray,
+                 counts: np.ndarray,
+                 positives: np.ndarray,
+                 first_seen: np.ndarray,
+                 lowest: np.ndarray,
+                 highest: np.ndarray):
+        self.keys = keys
+        self.counts = counts
+        self.positives = positives
+        self.first_seen = first_seen
+        self.lowest = lowest
+        self.highest = highest
+
+    @classmethod
+    def from_values(cls,
+                    values: np.ndarray,
+                    labels: np.ndarray,
+                    first_index: int = 0,
+                    bins: FeatureBins = None) -> 'FeatureStatistics':
+        """Count the labels of some points for each value of the feature
+
+        Parameters
+        ----------
+            values : np.array[float]
+                The value of the feature for each point.
+            labels : np.array[bool]
+                The labels of the points.
+            first_index : int
+                The index of the first of these points in the whole set.
+            bins : FeatureBins
+                If not None, the points are counted per bin instead of
+                per value.
+
+        Returns
+        -------
+            FeatureStatistics
+                The label counts of the points.
+        """
+        keys = values if bins is None else bins.get_codes(values)
+        distinct, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(distinct))
+        positives = np.bincount(inverse[labels], minlength=len(distinct))
+        if bins is None:
+            lowest = highest = distinct.astype(float)
+        else:
+            lowest = np.full(len(distinct), np.inf)
+            highest = np.full(len(distinct), -np.inf)
+            np.minimum.at(lowest, inverse, values)
+            np.maximum.at(highest, inverse, values)
+        return cls(distinct, counts, positives, first + first_index, lowest, highest)
+
+    def merge(self, other: 'FeatureStatistics') -> 'FeatureStatistics':
+        """Combine the counts of two disjoint sets of points
+
+        Parameters
+        ----------
+            other : FeatureStatistics
+                The counts of the other set, made with the same binning.
+
+        Returns
+        -------
+            FeatureStatistics
+                The counts of the union of the two sets.
+        """
+        distinct, inverse = np.unique(np.concatenate((self.keys, other.keys)), return_inverse=True)
+        counts = np.bincount(inverse, np.concatenate((self.counts, other.counts)), len(distinct))
+        positives = np.bincount(inverse, np.concatenate((self.positives, other.positives)), len(distinct))
+        first_seen = np.full(len(distinct), np.iinfo(np.int64).max)
+        lowest = np.full(len(distinct), np.inf)
+        highest = np.full(len(distinct), -np.inf)
+        np.minimum.at(first_seen, inverse, np.concatenate((self.first_seen, other.first_seen)))
+        np.minimum.at(lowest, inverse, np.concatenate((self.lowest, other.lowest)))
+        np.maximum.at(highest, inverse, np.concatenate((self.highest, other.highest)))
+        return FeatureStatistics(distinct, counts.astype(np.int64), positives.astype(np.int64),
+                                 first_seen, lowest, highest)
+
+class SplitStatistics:
+    """The sufficient statistics to choose the split of a set of points
+
+    For every feature, the number of points and of positive points for
+    each of its values (or bins) is enough to find the split PointSet
+    would choose, without keeping the points themselves. The statistics
+    of several chunks or shards of points can be merged.
+
+    Attributes
+    ----------
+        types : List[FeaturesTypes]
+            The types of the features.
+        features : List[FeatureStatistics]
+            The statistics of each feature, or None before any update.
+        bins : Dict[int, FeatureBins]
+            The binning of the continuous features, or None if they are
+            counted per exact value.
+        nb_points : int
+            The number of points counted so far.
+        nb_positives : int
+            The number of points labeled True counted so far.
+    """
+    def __init__(self, types: List[FeaturesTypes], bins: Dict[int, FeatureBins] = None):
+        """
+        Parameters
+        ----------
+        types : List[FeaturesTypes]
+            The types of the features.
+        bins : Dict[int, FeatureBins]
+            If not None, the continuous features listed in it are
+            counted per bin, which bounds the size of the statistics
+            but makes the threshold search approximate.
+        """
+        self.types = types
+        self.bins = bins if bins is not None else {}
+        self.features = [None]*len(types)
+        self.nb_points = 0
+        self.nb_positives = 0
+        self.min_split_points = 1
+        self.best_split_type = None
+
+    @classmethod
+    def from_chunks(cls,
+                    chunks: Iterable[Tuple[np.ndarray, np.ndarray]],
+                    types: List[FeaturesTypes],
+                    bins: Dict[int, FeatureBins] = None) -> 'SplitStatistics':
+        """Compute the statistics of a stream of chunks of points in one pass
+
+        Parameters
+        ----------
+            chunks : Iterable[Tuple[np.array[float], np.array[bool]]]
+                The features and labels of each chunk, for instance
+                from `read_write.iter_chunks`.
+            types : List[FeaturesTypes]
+                The types of the features.
+            bins : Dict[int, FeatureBins]
+                The binning of the continuous features, or None.
+
+        Returns
+        -------
+            SplitStatistics
+                The statistics of all the points of the stream.
+        """
+        statistics = cls(types, bins)
+        for features, labels in chunks:
+            statistics.update(features, labels)
+        return statistics
+
+    def update(self, features: np.ndarray, labels: np.ndarray) -> None:
+        """Add a chunk of points to the statistics
+
+        Parameters
+        ----------
+            features : np.array[float]
+                2D array containing the features of the points.
+            labels : np.array[bool]
+                The labels of the points.
+        """
+        features = np.asarray(features, dtype=float).reshape(len(labels), len(self.types))
+        labels = np.asarray(labels, dtype=bool)
+        for j in range(len(self.types)):
+            chunk = FeatureStatistics.from_values(features[:, j], labels, self.nb_points, self.bins.get(j))
+            self.features[j] = chunk if self.features[j] is None else self.features[j].merge(chunk)
+        self.nb_points += len(labels)
+        self.nb_positives += int(np.count_nonzero(labels))
+
+    def merge(self, other: 'SplitStatistics') -> None:
+        """Add the statistics of another set of points, made with the same bins
+
+        The points of `other` are numbered after the ones of this set.
+        """
+        for j, feature in enumerate(other.features):
+            if feature is None:
+                continue
+            shifted = FeatureStatistics(feature.keys, feature.counts, feature.positives,
+                                        feature.first_seen + self.nb_points, feature.lowest, feature.highest)
+            self.features[j] = shifted if self.features[j] is None else self.features[j].merge(shifted)
+        self.nb_points += other.nb_points
+        self.nb_positives += other.nb_positives
+
+    def add_min_split_points(self, min_split_points: int) -> None:
+        self.min_split_points = min_split_points
+
+    def get_gini(self) -> float:
+        """Computes the Gini score of the set of points
+
+        Returns
+        -------
+        float
+            The Gini score of the set of points
+        """
+        return gini_from_counts(self.nb_points, self.nb_positives)
+
+    def get_best_gain(self) -> Tuple[int, float]:
+        """Compute the feature along which splitting provides the best gain
+
+        It gives the same result as `PointSet.get_best_gain` on the
+        same points, as long as no continuous feature is binned.
+
+        Returns
+        -------
+        int
+            The ID of the feature along which splitting the set provides the
+            best Gini gain.
+        float
+            The best Gini gain achievable by splitting this set along one of
+            its features.
+        """
+        ID_best_gini_gain = -1
+        best_gini_gain = 0
+        self.best_split_type = None
+        if self.nb_points == 0:
+            return None, None
+
+        gini = self.get_gini()
+        for j, feature_type in enumerate(self.types):
+            gini_gain, split = self.get_feature_split(j, gini)
+            if gini_gain is not None and gini_gain > best_gini_gain:
+                best_gini_gain = gini_gain
+                ID_best_gini_gain = j
+                self.best_split_type = feature_type
+                self.best_split = split
+
+        if ID_best_gini_gain == -1:
+            return None, None
+        return ID_best_gini_gain, best_gini_gain
+
+    def get_feature_split(self, j: int, gini: float) -> Tuple[float, float]:
+        """Compute the best Gini gain of splitting along the feature `j`
+
+        Parameters
+        ----------
+        j : int
+            The ID of the feature.
+        gini : float
+            The Gini score of the set of points.
+
+        Returns
+        -------
+        float
+            The best Gini gain, or None if no split is valid.
+        float
+            The category or threshold of the best split, None for a
+            boolean feature.
+        """
+        feature = self.features[j]
+        if self.types[j] == FeaturesTypes.BOOLEAN:
+            left = feature.keys == 0
+            left_counts = np.array([feature.counts[left].sum()])
+            left_positives = np.array([feature.positives[left].sum()])
+            candidates = None
+        elif self.types[j] == FeaturesTypes.CLASSES:
+            # one category against the others, in order of first appearance
+            candidates = np.argsort(feature.first_seen, kind='stable')
+            left_counts = feature.counts[candidates]
+            left_positives = feature.positives[candidates]
+        else:
+            # between consecutive keys, in increasing order
+            candidates = np.arange(len(feature.keys) - 1)
+            left_counts = np.cumsum(feature.counts)[:-1]
+            left_positives = np.cumsum(feature.positives)[:-1]
+
+        gains = split_gains(gini, left_counts, left_positives, self.nb_points, self.nb_positives, self.min_split_points)
+        if len(gains) == 0:
+            return None, None
+        best = np.argmax(gains)
+        if gains[best] == -np.inf:
+            return None, None
+
+        if self.types[j] == FeaturesTypes.BOOLEAN:
+            return gains[best], None
+        if self.types[j] == FeaturesTypes.CLASSES:
+            return gains[best], feature.keys[candidates[best]]
+        return gains[best], (feature.highest[best] + feature.lowest[best + 1])/2
+
+    def get_best_threshold(self) -> float:
+        if self.best_split_type == None:
+            raise Exception("Bad call to get_best_threshold")
+
+        return self.best_split
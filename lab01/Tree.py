@@ -1,25 +1,78 @@
-from typing import List
+from typing import Dict, List, Tuple
 
+import heapq
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 from PointSet import PointSet, FeaturesTypes
+from binning import FeatureBins
+from CompiledTree import CompiledTree
+from parallel import FeatureExecutor, SharedArray, attach
+from profiling import TrainingProfiler
+from level_wise import LevelWiseGrower
+from sharding import ShardPool
+import evaluation
 
 class Tree:
     """A decision Tree
 
+    The nodes do not keep their training points once they are built:
+    an inner node only stores its split, its children and the decision
+    it would take as a leaf, and a leaf its decision.
+
+    The split of a node does not depend on the height of the tree, so
+    a tree of height h is the tree of any larger height cut at depth h:
+    `truncate` and the `h` parameter of `decide_batch` give the smaller
+    trees without training them again.
+
     Attributes
     ----------
-        points : PointSet
-            The training points of the tree
         ID : int
-            The ID of the feature along which the tree splits
+            The ID of the feature along which the tree splits, or None
+            if the tree is a leaf
+        kind : FeaturesTypes
+            The type of the feature along which the tree splits
+        threshold : float
+            The category (CLASSES) or the threshold (REAL) of the
+            split, None for boolean splits and subset splits
+        categories : frozenset
+            The categories going to the first child, for a subset split
+            of a categorial feature, None otherwise
+        left_node : Tree
+            The sub-tree receiving the points with the boolean feature
+            equal to 0, with the category equal to `threshold` (or in
+            `categories`) or with the continuous feature lower than
+            `threshold`
+        right_node : Tree
+            The sub-tree receiving the other points
         decision : bool
-            The decision of the tree
+            The decision of the tree if it is a leaf, or if it is cut
+            into a leaf (the majority label of its training points)
     """
+    __slots__ = ('types', 'height', 'ID', 'kind', 'threshold', 'categories',
+                 'left_node', 'right_node', 'decision', '_compiled')
+
     def __init__(self,
                  features: List[List[float]],
                  labels: List[bool],
                  types: List[FeaturesTypes],
                  h: int = 1,
-                 min_split_points: int = 1):
+                 min_split_points: int = 1,
+                 presort: bool = False,
+                 max_bins: int = None,
+                 workers: int = 1,
+                 executor: str = 'thread',
+                 subtree_workers: int = 1,
+                 min_subtree_points: int = 20000,
+                 sample: np.ndarray = None,
+                 max_features: int = None,
+                 random_state: int = None,
+                 classes_split: str = 'one_vs_rest',
+                 sorted_indices: Dict[int, np.ndarray] = None,
+                 profiler: TrainingProfiler = None,
+                 growth: str = 'depth',
+                 shards: int = 1):
         """
         Parameters
         ----------
@@ -37,79 +90,254 @@ class Tree:
                 The maximum height of the tree.
             min_split_points : int
                 The minimum number of points required to split a node.
+            presort : bool
+                If True, the points are sorted along each continuous
+                feature once for the whole tree, and each node receives
+                its points already sorted instead of sorting them again.
+                The resulting tree is the same.
+            max_bins : int
+                If not None, each continuous feature is quantized once
+                into at most `max_bins` bins (at most 256 to keep uint8
+                codes), and the thresholds are only searched between
+                bins, from per-bin label counts. The histogram of one
+                child is derived from the ones of its parent and of its
+                sibling. The tree is approximate when a feature takes
+                more than `max_bins` different values, and identical to
+                the default one otherwise. It has precedence over
+                `presort`.
+            workers : int
+                If greater than 1, the features of each large enough
+                node are scored concurrently by this many workers. The
+                tree is the same.
+            executor : str
+                'thread' to score the features in a thread pool (the
+                NumPy kernels release the GIL), or 'process' to score
+                them in a process pool attached to a shared-memory copy
+                of the training points.
+            subtree_workers : int
+                If greater than 1, the largest sub-trees are built
+                concurrently by a pool of this many processes, attached
+                to a shared-memory copy of the training points. The tree
+                is the same.
+            min_subtree_points : int
+                The sub-trees with fewer training points are built in
+                the calling process, where shipping them to a worker
+                would cost more than building them.
+            sample : np.array[int]
+                If not None, the indices of the training points to learn
+                from, possibly repeated (for instance a bootstrap sample).
+                The points are not copied.
+            max_features : int
+                If not None, each node only considers this many features,
+                drawn at random, as in random forests. It cannot be
+                combined with `subtree_workers`.
+            random_state : int
+                The seed of the draws of `max_features`.
+            classes_split : str
+                'one_vs_rest' to split the categorial features between
+                one category and the others, or 'subset' to split them
+                between the best subset of categories and the others,
+                found by sorting the categories by rate of positive
+                points in O(n + k log k).
+            sorted_indices : Dict[int, np.array[int]]
+                If not None, the training points (or the `sample`) are
+                already sorted along each continuous feature, for
+                instance by filtering an order computed once for a
+                larger set of points. It implies `presort`.
+            profiler : TrainingProfiler
+                If not None, records the cost of building each node
+                (time, points, features, candidate splits, allocated
+                bytes). It cannot be combined with `subtree_workers`.
+            growth : str
+                'depth' to build the nodes one by one, depth first, or
+                'level' to build all the nodes of a depth at once, with
+                a few passes over the training points per depth instead
+                of a few passes over the points of each node (see
+                `level_wise.LevelWiseGrower`). The tree is the same,
+                except that the draws of `max_features` happen in
+                breadth-first order. It cannot be combined with
+                `workers`, `subtree_workers` or `profiler`.
+            shards : int
+                If greater than 1, with the level-wise growth, the
+                training points are split into this many contiguous
+                shards, each held by a worker process which counts the
+                labels of its points by node and by value (or bin), and
+                the splits are chosen from the sum of these counts (see
+                `sharding.ShardPool`). The continuous features must be
+                binned (`max_bins`). The tree is the same.
             height : int
                 The height of the tree.
         """
         
-        self.points = PointSet(features, labels, types)
-        self.points.add_min_split_points(min_split_points)
-        ID_best_gini_gain = self.points.get_best_gain()[0]
+        # the training points are stored once in contiguous arrays; every
+        # node only holds the indices of its points in these arrays
+        if max_features is not None and subtree_workers > 1:
+            raise ValueError('max_features cannot be combined with subtree_workers')
+        if profiler is not None and subtree_workers > 1:
+            raise ValueError('profiler cannot be combined with subtree_workers')
+        if classes_split not in ('one_vs_rest', 'subset'):
+            raise ValueError(f'Unknown classes split : {classes_split}')
+        if growth not in ('depth', 'level'):
+            raise ValueError(f'Unknown growth : {growth}')
+        if growth == 'level' and (workers > 1 or subtree_workers > 1 or profiler is not None):
+            raise ValueError('level-wise growth cannot be combined with workers, subtree_workers or profiler')
+        if shards > 1 and growth != 'level':
+            raise ValueError('shards require the level-wise growth')
+        data = _TrainingSet(features, labels, types, min_split_points, max_bins, sample)
+        data.classes_split = classes_split
+        data.profiler = profiler
+        if max_features is not None:
+            data.max_features = min(max_features, len(types))
+            data.rng = np.random.default_rng(random_state)
+        if workers > 1:
+            data.executor = FeatureExecutor(data.features, data.labels, workers, executor)
+            data.features, data.labels = data.executor.features, data.executor.labels
+        indices = np.arange(len(data.labels)) if sample is None else np.asarray(sample)
+        if growth == 'level':
+            _grow_level_wise(self, data, indices, h, shards)
+            return
+        if max_bins is not None:
+            sorted_indices = None
+        elif presort and sorted_indices is None:
+            sorted_indices = data.presort(indices)
+        histograms = data.get_histograms(indices) if max_bins is not None else None
+        try:
+            if subtree_workers > 1:
+                _grow_in_parallel(self, data, (indices, h, sorted_indices, histograms),
+                                  subtree_workers, min_subtree_points, max_bins)
+            else:
+                self._grow(data, indices, h, sorted_indices, histograms)
+        finally:
+            if data.executor is not None:
+                data.executor.shutdown()
+
+        # raise NotImplementedError('Implement this method for Question 4')
+
+    def _grow(self,
+              data: '_TrainingSet',
+              indices: np.ndarray,
+              h: int,
+              sorted_indices: Dict[int, np.ndarray] = None,
+              histograms: Dict[int, Tuple[FeatureBins, np.ndarray, np.ndarray]] = None) -> None:
+        """Build the node from the training points at `indices`, and its children
+
+        Parameters
+        ----------
+            data : _TrainingSet
+                All the training points of the tree.
+            indices : np.array[int]
+                The indices of the training points of this node.
+            h : int
+                The maximum height of the node.
+            sorted_indices : Dict[int, np.array[int]]
+                For each continuous feature, `indices` sorted by
+                increasing value of the feature, or None if the tree
+                is not presorted.
+            histograms : Dict[int, Tuple[FeatureBins, np.array[int], np.array[int]]]
+                For each continuous feature, its bins and the histograms
+                of the points of this node, or None if the tree is not
+                binned.
+        """
+        children = self._split(data, indices, h, sorted_indices, histograms)
+        if children is not None:
+            if data.profiler is not None:
+                data.profiler.descend()
+            self.left_node = self._child(data, *children[0])
+            self.right_node = self._child(data, *children[1])
+            if data.profiler is not None:
+                data.profiler.ascend()
+
+    def _split(self,
+               data: '_TrainingSet',
+               indices: np.ndarray,
+               h: int,
+               sorted_indices: Dict[int, np.ndarray] = None,
+               histograms: Dict[int, Tuple[FeatureBins, np.ndarray, np.ndarray]] = None) -> Tuple[Tuple, Tuple]:
+        """Build the node from the training points at `indices`, but not its children
+
+        The parameters are the ones of `_grow`.
+
+        Returns
+        -------
+            Tuple
+                The arguments of `_grow` (after `data`) for the first
+                child, or None if the node is a leaf.
+            Tuple
+                Likewise for the second child.
+        """
+        types = data.types
+        profile = None
+        if data.profiler is not None:
+            profile = data.profiler.start_node(len(indices))
+        # the point set is only needed while the node is being built
+        points = PointSet(data.features, data.labels, types, indices, sorted_indices, histograms)
+        points.add_min_split_points(data.min_split_points)
+        points.classes_split = data.classes_split
+        points.profile = profile
+        ID_best_gini_gain = points.get_best_gain(data.executor, data.draw_features())[0]
         self.height = h
         self.types = types
+        self.kind = None
+        self.threshold = None
+        self.categories = None
+        self.left_node = None
+        self.right_node = None
+        self._compiled = None
+        # recorded for the inner nodes too, which are leaves once the tree is truncated
+        cnt = np.count_nonzero(points.labels)
+        if cnt >= len(indices) - cnt:
+            self.decision = True
+        else:
+            self.decision = False
         
         if ID_best_gini_gain != None and h > 0:
+            self.kind = types[ID_best_gini_gain]
+            column = data.features[indices, ID_best_gini_gain]
+            if self.kind == FeaturesTypes.BOOLEAN:
+                goes_left = column == 0
+            elif self.kind == FeaturesTypes.CLASSES and data.classes_split == 'subset':
+                left_categories = points.get_best_threshold()
+                self.categories = frozenset(left_categories.tolist())
+                goes_left = np.isin(column, left_categories)
+            elif self.kind == FeaturesTypes.CLASSES:
+                self.threshold = points.get_best_threshold()
+                goes_left = column == self.threshold
+            else:
+                self.threshold = points.get_best_threshold()
+                goes_left = column < self.threshold
             
-            if types[ID_best_gini_gain] == FeaturesTypes.BOOLEAN:
-                features_0 = []
-                features_1 = []
-                labels_0 = []
-                labels_1 = []
-                for i in range(len(features)):
-                    if features[i][ID_best_gini_gain] == 0:
-                        features_0.append(features[i])
-                        labels_0.append(labels[i])
-                    else:
-                        features_1.append(features[i])
-                        labels_1.append(labels[i])
-                
-                self.ID = ID_best_gini_gain
-                self.left_node = Tree(features_0, labels_0, types, h - 1, min_split_points)
-                self.right_node = Tree(features_1, labels_1, types, h - 1, min_split_points)
-                
-            elif types[ID_best_gini_gain] == FeaturesTypes.CLASSES:
-                features_0 = []
-                features_1 = []
-                labels_0 = []
-                labels_1 = []
-                for i in range(len(features)):
-                    if features[i][ID_best_gini_gain] == self.points.get_best_threshold():
-                        features_0.append(features[i])
-                        labels_0.append(labels[i])
-                    else:
-                        features_1.append(features[i])
-                        labels_1.append(labels[i])
-                
-                self.ID = ID_best_gini_gain
-                self.left_node = Tree(features_0, labels_0, types, h - 1, min_split_points)
-                self.right_node = Tree(features_1, labels_1, types, h - 1, min_split_points)
-                    
+            left_indices = indices[goes_left]
+            right_indices = indices[~goes_left]
+            left_sorted, right_sorted = data.partition(sorted_indices, left_indices)
+            if histograms is not None and h > 1:
+                left_histograms, right_histograms = data.split_histograms(histograms, left_indices, right_indices)
             else:
-                features_0 = []
-                features_1 = []
-                labels_0 = []
-                labels_1 = []
-                for i in range(len(features)):
-                    if features[i][ID_best_gini_gain] < self.points.get_best_threshold():
-                        features_0.append(features[i])
-                        labels_0.append(labels[i])
-                    else:
-                        features_1.append(features[i])
-                        labels_1.append(labels[i])
-                
-                self.ID = ID_best_gini_gain
-                self.left_node = Tree(features_0, labels_0, types, h - 1, min_split_points)
-                self.right_node = Tree(features_1, labels_1, types, h - 1, min_split_points)
+                left_histograms, right_histograms = None, None
+            
+            self.ID = ID_best_gini_gain
+            if profile is not None:
+                profile.allocated_bytes = _get_nbytes(goes_left, left_indices, right_indices,
+                                                      left_sorted, right_sorted,
+                                                      left_histograms, right_histograms)
+                data.profiler.end_node(profile)
+            return ((left_indices, h - 1, left_sorted, left_histograms),
+                    (right_indices, h - 1, right_sorted, right_histograms))
             
         else:
             self.ID = None
-            cnt = sum(labels)
-                
-            if cnt >= len(labels) - cnt:
-                self.decision = True
-            else:
-                self.decision = False
+            if profile is not None:
+                data.profiler.end_node(profile)
+            return None
 
-        # raise NotImplementedError('Implement this method for Question 4')
+    @classmethod
+    def _child(cls, *args) -> 'Tree':
+        """Build a sub-tree without going through `__init__`
+
+        The parameters are the ones of `_grow`.
+        """
+        node = cls.__new__(cls)
+        node._grow(*args)
+        return node
 
     def decide(self, features: List[float]) -> bool:
         """Give the guessed label of the tree to an unlabeled point
@@ -127,21 +355,482 @@ class Tree:
         """
         if self.ID == None:
             return self.decision
-        if self.types[self.ID] == FeaturesTypes.BOOLEAN:
+        if self.kind == FeaturesTypes.BOOLEAN:
             if features[self.ID] == 0:
                 return self.left_node.decide(features)
             else:
                 return self.right_node.decide(features)
-        elif self.types[self.ID] == FeaturesTypes.CLASSES:
-            if features[self.ID] == self.points.get_best_threshold():
+        elif self.kind == FeaturesTypes.CLASSES:
+            if self.categories is not None:
+                goes_left = features[self.ID] in self.categories
+            else:
+                goes_left = features[self.ID] == self.threshold
+            if goes_left:
                 return self.left_node.decide(features)
             else:
                 return self.right_node.decide(features)
         else:
-            if features[self.ID] < self.points.get_best_threshold():
+            if features[self.ID] < self.threshold:
                 return self.left_node.decide(features)
             else:
                 return self.right_node.decide(features)
         
         # raise NotImplementedError('Implement this method for Question 4')
 
+    def compile(self) -> CompiledTree:
+        """Flatten the trained tree into parallel arrays
+
+        Returns
+        -------
+            CompiledTree
+                The flattened tree, able to classify whole batches of
+                points at once.
+        """
+        if self._compiled is None:
+            self._compiled = CompiledTree.from_tree(self)
+        return self._compiled
+
+    def decide_batch(self, features: List[List[float]], h: int = None) -> np.ndarray:
+        """Give the guessed labels of the tree to a batch of unlabeled points
+
+        Parameters
+        ----------
+            features : List[List[float]]
+                The features of the unlabeled points. Each sublist
+                represents a single point.
+            h : int
+                If not None, the labels are guessed by the tree cut at
+                this height, that is by the tree of height `h` trained
+                on the same points.
+
+        Returns
+        -------
+            np.array[bool]
+                The labels of the unlabeled points,
+                guessed by the Tree
+        """
+        return self.compile().decide_batch(features, h)
+
+    def truncate(self, h: int) -> 'Tree':
+        """Cut the tree at a smaller height
+
+        The nodes at depth `h` become leaves taking their majority
+        decision. The result is the tree of height `h` trained on the
+        same points (as long as the nodes do not draw random features).
+
+        Parameters
+        ----------
+            h : int
+                The height of the cut tree, at most the height of this
+                tree.
+
+        Returns
+        -------
+            Tree
+                A new tree, sharing nothing with this one.
+        """
+        if h > self.height:
+            raise ValueError(f'Cannot truncate a tree of height {self.height} to height {h}')
+        node = Tree.__new__(Tree)
+        for name in Tree.__slots__:
+            setattr(node, name, getattr(self, name))
+        node.height = h
+        node._compiled = None
+        if self.ID is None:
+            return node
+        if h == 0:
+            node.ID = node.kind = node.threshold = node.categories = None
+            node.left_node = node.right_node = None
+            return node
+        node.left_node = self.left_node.truncate(h - 1)
+        node.right_node = self.right_node.truncate(h - 1)
+        return node
+
+    def score_heights(self,
+                      features: List[List[float]],
+                      labels: List[bool],
+                      heights: List[int] = None) -> Dict[int, float]:
+        """Compute the F1-score of the tree cut at several heights
+
+        All the heights are scored with a single pass of the points
+        down the tree, instead of one training and one prediction per
+        height.
+
+        Parameters
+        ----------
+            features : List[List[float]]
+                The features of the test points.
+            labels : List[bool]
+                The labels of the test points.
+            heights : List[int]
+                The heights to score, by default from 1 to the height
+                of the tree.
+
+        Returns
+        -------
+            Dict[int, float]
+                The F1-score of the tree cut at each height.
+        """
+        if heights is None:
+            heights = range(1, self.height + 1)
+        if any(h > self.height for h in heights):
+            raise ValueError(f'Cannot score a tree of height {self.height} at heights {list(heights)}')
+        guesses = self.compile().decide_batch_by_height(features, heights)
+        return {h: evaluation.ConfusionMatrix(labels, guesses[h]).F1_score() for h in heights}
+
+    def get_memory_footprint(self) -> int:
+        """Estimate the memory used by the trained tree
+
+        It counts every node object and its threshold, the list of
+        feature types (shared by all the nodes) and the arrays of the
+        compiled tree if it has been compiled.
+
+        Returns
+        -------
+            int
+                The footprint of the tree, in bytes.
+        """
+        size = sys.getsizeof(self.types)
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            size += sys.getsizeof(node)
+            if node.threshold is not None:
+                size += sys.getsizeof(node.threshold)
+            if node.categories is not None:
+                size += sys.getsizeof(node.categories) + sum(map(sys.getsizeof, node.categories))
+            if node._compiled is not None:
+                size += node._compiled.get_memory_footprint()
+            if node.ID is not None:
+                stack += [node.left_node, node.right_node]
+        return size
+
+class _TrainingSet:
+    """The training points shared by all the nodes of a Tree being built
+
+    Attributes
+    ----------
+        features : np.array[float]
+            2D array containing the features of the training points.
+        labels : np.array[bool]
+            The labels of the training points.
+        types : List[FeaturesTypes]
+            The types of the features.
+        min_split_points : int
+            The minimum number of points required to split a node.
+        bins : Dict[int, FeatureBins]
+            The quantization of each continuous feature, or None if
+            the tree is not binned.
+        executor : FeatureExecutor
+            The workers scoring the features of the nodes concurrently,
+            or None.
+        max_features : int
+            The number of features drawn at random for each node, or
+            None to consider them all.
+        rng : np.random.Generator
+            The generator of these draws.
+        classes_split : str
+            How the categorial features are split, see Tree.
+        profiler : TrainingProfiler
+            The recorder of the cost of each node, or None.
+    """
+    def __init__(self,
+                 features: List[List[float]],
+                 labels: List[bool],
+                 types: List[FeaturesTypes],
+                 min_split_points: int,
+                 max_bins: int = None,
+                 sample: np.ndarray = None):
+        # column-major storage: the nodes always read one feature at a time
+        self.features = np.asarray(features, order='F')
+        self.labels = np.asarray(labels)
+        if self.features.ndim != 2:
+            self.features = self.features.reshape((len(self.labels), len(types)), order='F')
+        self.types = types
+        self.min_split_points = min_split_points
+        self.executor = None
+        self.max_features = None
+        self.rng = None
+        self.classes_split = 'one_vs_rest'
+        self.profiler = None
+        self.bins = None
+        if max_bins is not None:
+            # the bins only depend on the training points, the other ones
+            # (for instance the test fold of a cross-validation) are just coded
+            self.bins = {j: FeatureBins(self.features[:, j], max_bins, sample)
+                         for j, feature_type in enumerate(types) if feature_type == FeaturesTypes.REAL}
+        # scratch mask over all the points, used to partition the sorted
+        # indices of a node; it is reset to False after each use
+        self._goes_left = np.zeros(len(self.labels), dtype=bool)
+
+    def draw_features(self) -> np.ndarray:
+        """Draw the features considered by a node
+
+        Returns
+        -------
+            np.array[int]
+                `max_features` distinct features in increasing order, so
+                that ties are broken as without the draw, or None if all
+                the features are considered.
+        """
+        if self.max_features is None:
+            return None
+        return np.sort(self.rng.choice(len(self.types), self.max_features, replace=False))
+
+    def presort(self, indices: np.ndarray) -> Dict[int, np.ndarray]:
+        """Sort the points at `indices` along each continuous feature
+
+        Returns
+        -------
+            Dict[int, np.array[int]]
+                Maps each continuous feature to `indices` sorted by
+                increasing value of the feature.
+        """
+        sorted_indices = {}
+        for j, feature_type in enumerate(self.types):
+            if feature_type == FeaturesTypes.REAL:
+                sorted_indices[j] = indices[np.argsort(self.features[indices, j])]
+        return sorted_indices
+
+    def partition(self,
+                  sorted_indices: Dict[int, np.ndarray],
+                  left_indices: np.ndarray) -> Tuple[Dict[int, np.ndarray], Dict[int, np.ndarray]]:
+        """Split the sorted indices of a node between its two children
+
+        The partition is stable, so the indices of each child stay
+        sorted, and it costs O(n) per feature instead of a new sort.
+
+        Parameters
+        ----------
+            sorted_indices : Dict[int, np.array[int]]
+                The sorted indices of the node, or None.
+            left_indices : np.array[int]
+                The indices of the points going to the first child.
+
+        Returns
+        -------
+            Dict[int, np.array[int]]
+                The sorted indices of the first child, or None.
+            Dict[int, np.array[int]]
+                The sorted indices of the second child, or None.
+        """
+        if sorted_indices is None:
+            return None, None
+        self._goes_left[left_indices] = True
+        left_sorted = {}
+        right_sorted = {}
+        for j, order in sorted_indices.items():
+            goes_left = self._goes_left[order]
+            left_sorted[j] = order[goes_left]
+            right_sorted[j] = order[~goes_left]
+        self._goes_left[left_indices] = False
+        return left_sorted, right_sorted
+
+    def get_histograms(self, indices: np.ndarray) -> Dict[int, Tuple[FeatureBins, np.ndarray, np.ndarray]]:
+        """Compute the histograms of the points at `indices` along each binned feature
+
+        Returns
+        -------
+            Dict[int, Tuple[FeatureBins, np.array[int], np.array[int]]]
+                Maps each continuous feature to its bins, the number of
+                points in each bin and the number of positive points in
+                each bin.
+        """
+        return {j: (bins, *bins.get_histogram(indices, self.labels)) for j, bins in self.bins.items()}
+
+    def split_histograms(self,
+                         histograms: Dict[int, Tuple[FeatureBins, np.ndarray, np.ndarray]],
+                         left_indices: np.ndarray,
+                         right_indices: np.ndarray) -> Tuple[Dict, Dict]:
+        """Derive the histograms of the two children of a node
+
+        Only the histograms of the smaller child are counted from its
+        points; the ones of the larger child are the difference between
+        the histograms of the node and of the smaller child.
+
+        Parameters
+        ----------
+            histograms : Dict[int, Tuple[FeatureBins, np.array[int], np.array[int]]]
+                The histograms of the node.
+            left_indices : np.array[int]
+                The indices of the points going to the first child.
+            right_indices : np.array[int]
+                The indices of the points going to the second child.
+
+        Returns
+        -------
+            Dict[int, Tuple[FeatureBins, np.array[int], np.array[int]]]
+                The histograms of the first child.
+            Dict[int, Tuple[FeatureBins, np.array[int], np.array[int]]]
+                The histograms of the second child.
+        """
+        left_is_smaller = len(left_indices) <= len(right_indices)
+        smaller = self.get_histograms(left_indices if left_is_smaller else right_indices)
+        larger = {j: (bins, counts - smaller[j][1], positives - smaller[j][2])
+                  for j, (bins, counts, positives) in histograms.items()}
+        if left_is_smaller:
+            return smaller, larger
+        return larger, smaller
+
+def _get_nbytes(*arrays) -> int:
+    """Sum the sizes of arrays, or of the arrays in dicts and tuples, or None"""
+    nbytes = 0
+    for array in arrays:
+        if isinstance(array, dict):
+            nbytes += _get_nbytes(*array.values())
+        elif isinstance(array, tuple):
+            nbytes += _get_nbytes(*array)
+        elif isinstance(array, np.ndarray):
+            nbytes += array.nbytes
+    return nbytes
+
+# the training sets rebuilt by the current worker process, by shared memory name
+_worker_training_sets = {}
+
+def _build_subtree(features_spec: Tuple,
+                   labels_spec: Tuple,
+                   types: List[FeaturesTypes],
+                   min_split_points: int,
+                   max_bins: int,
+                   sample_spec: Tuple,
+                   classes_split: str,
+                   indices: np.ndarray,
+                   h: int,
+                   sorted_indices: Dict[int, np.ndarray],
+                   histogram_counts: Dict[int, Tuple[np.ndarray, np.ndarray]]) -> Tree:
+    """Build a whole sub-tree in a worker process
+
+    The training points are attached from shared memory, and the bins
+    are computed again from them (once per worker) rather than shipped,
+    from the sample of the root if `sample_spec` is not None.
+    """
+    if features_spec[0] not in _worker_training_sets:
+        sample = attach(sample_spec) if sample_spec is not None else None
+        _worker_training_sets[features_spec[0]] = _TrainingSet(attach(features_spec), attach(labels_spec),
+                                                               types, min_split_points, max_bins, sample)
+        _worker_training_sets[features_spec[0]].classes_split = classes_split
+    data = _worker_training_sets[features_spec[0]]
+    histograms = None
+    if histogram_counts is not None:
+        histograms = {j: (data.bins[j], *counts) for j, counts in histogram_counts.items()}
+    return Tree._child(data, indices, h, sorted_indices, histograms)
+
+def _grow_in_parallel(root: Tree,
+                      data: _TrainingSet,
+                      root_args: Tuple,
+                      workers: int,
+                      min_subtree_points: int,
+                      max_bins: int) -> None:
+    """Build a tree by sharing its sub-trees between worker processes
+
+    The nodes are first split in the calling process, the largest first,
+    until there are enough sub-trees to keep every worker busy. The
+    remaining sub-trees are then queued, the largest first, and each idle
+    worker takes the next one, while the ones smaller than
+    `min_subtree_points` are built in the calling process.
+
+    Parameters
+    ----------
+        root : Tree
+            The (not yet built) root of the tree.
+        data : _TrainingSet
+            All the training points of the tree.
+        root_args : Tuple
+            The arguments of `Tree._grow` (after `data`) for the root.
+        workers : int
+            The number of worker processes.
+        min_subtree_points : int
+            The minimum number of points of a sub-tree sent to a worker.
+        max_bins : int
+            The maximum number of bins of the tree, or None.
+    """
+    # (-nb_points, order, parent, side, args): side is 'left_node' or
+    # 'right_node' of the parent, the root has no parent
+    frontier = [(-len(root_args[0]), 0, None, None, root_args)]
+    order = 1
+    while frontier and len(frontier) < 4*workers and -frontier[0][0] >= min_subtree_points:
+        _, _, parent, side, args = heapq.heappop(frontier)
+        node = root if parent is None else Tree.__new__(Tree)
+        if parent is not None:
+            setattr(parent, side, node)
+        children = node._split(data, *args)
+        if children is not None:
+            for child_side, child_args in zip(('left_node', 'right_node'), children):
+                heapq.heappush(frontier, (-len(child_args[0]), order, node, child_side, child_args))
+                order += 1
+
+    shared = [SharedArray(data.features, order='F'), SharedArray(data.labels)]
+    # the bins of the workers are chosen from the same training points
+    sample_spec = None
+    if max_bins is not None:
+        shared.append(SharedArray(np.asarray(root_args[0])))
+        sample_spec = shared[2].spec
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = []
+            for _, _, parent, side, args in sorted(frontier):
+                if parent is None:
+                    root._grow(data, *args)
+                elif len(args[0]) >= min_subtree_points:
+                    indices, h, sorted_indices, histograms = args
+                    histogram_counts = None
+                    if histograms is not None:
+                        histogram_counts = {j: (counts, positives) for j, (_, counts, positives) in histograms.items()}
+                    future = pool.submit(_build_subtree, shared[0].spec, shared[1].spec,
+                                         data.types, data.min_split_points, max_bins, sample_spec,
+                                         data.classes_split, indices, h, sorted_indices, histogram_counts)
+                    futures.append((parent, side, future))
+                else:
+                    setattr(parent, side, Tree._child(data, *args))
+            for parent, side, future in futures:
+                setattr(parent, side, future.result())
+    finally:
+        for array in shared:
+            array.release()
+
+def _grow_level_wise(root: Tree, data: _TrainingSet, indices: np.ndarray, h: int, shards: int = 1) -> None:
+    """Build a tree one depth at a time
+
+    Parameters
+    ----------
+        root : Tree
+            The (not yet built) root of the tree.
+        data : _TrainingSet
+            All the training points of the tree.
+        indices : np.array[int]
+            The indices of the training points of the tree.
+        h : int
+            The maximum height of the tree.
+        shards : int
+            The number of worker processes holding the training points,
+            or 1 to hold them in the calling process.
+    """
+    draw_features = data.draw_features if data.max_features is not None else None
+    grower = LevelWiseGrower(data.features, data.labels, data.types, indices, data.min_split_points,
+                             data.bins, data.classes_split, draw_features)
+    if shards > 1:
+        with ShardPool(grower, data.features, data.labels, indices, shards) as pool:
+            levels = grower.grow(h, pool)
+    else:
+        levels = grower.grow(h)
+    nodes = [root]
+    for depth, level in enumerate(levels):
+        children = [Tree.__new__(Tree) for _ in range(2*np.count_nonzero(level.feature >= 0))]
+        for i, node in enumerate(nodes):
+            node.types = data.types
+            node.height = h - depth
+            node.decision = bool(level.decision[i])
+            node.ID = node.kind = node.threshold = node.categories = None
+            node.left_node = node.right_node = None
+            node._compiled = None
+            if level.feature[i] < 0:
+                continue
+            node.ID = int(level.feature[i])
+            node.kind = data.types[node.ID]
+            if level.categories[i] is not None:
+                node.categories = frozenset(level.categories[i].tolist())
+            elif node.kind != FeaturesTypes.BOOLEAN:
+                node.threshold = level.threshold[i]
+            node.left_node = children[level.first_child[i]]
+            node.right_node = children[level.first_child[i] + 1]
+        nodes = children
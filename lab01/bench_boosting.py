@@ -0,0 +1,49 @@
+"""Compare the training time of a boosting round with the one of a single Tree
+
+Usage: python bench_boosting.py [nb_trees] [boosting height] [tree height] [files...]
+"""
+import sys
+import time
+
+from GradientBoosting import GradientBoostingClassifier
+from Tree import Tree
+from read_write import load_dataset
+import evaluation
+
+def benchmark(file_name: str, nb_trees: int, boosting_h: int, tree_h: int, training_proportion: float = .8) -> None:
+    features, labels, types = load_dataset(file_name).to_arrays()
+    training_nb = int(len(features)*training_proportion)
+    training_features, training_labels = features[:training_nb], labels[:training_nb]
+    test_features, test_labels = features[training_nb:], labels[training_nb:]
+    print(f'{file_name}: {training_nb} training points, {len(types)} features')
+
+    start = time.perf_counter()
+    tree = Tree(training_features, training_labels, types, h=tree_h)
+    training_time = time.perf_counter() - start
+    start = time.perf_counter()
+    guesses = tree.decide_batch(test_features)
+    scoring_time = time.perf_counter() - start
+    print(f'  tree of height {tree_h} : training {training_time:.3f}s, '
+          f'scoring {len(test_features)/scoring_time:.0f} points/s, '
+          f'F1 {evaluation.F1_score(test_labels, guesses.tolist()):.4f}')
+
+    start = time.perf_counter()
+    model = GradientBoostingClassifier(training_features, training_labels, types, nb_trees=nb_trees, h=boosting_h,
+                                       subsample=.8, validation_fraction=.1, random_state=0)
+    training_time = time.perf_counter() - start
+    nb_rounds = len(model.train_losses)
+    start = time.perf_counter()
+    guesses = model.decide_batch(test_features)
+    scoring_time = time.perf_counter() - start
+    print(f'  boosting, height {boosting_h} : {nb_rounds} rounds ({model.best_round} trees kept), '
+          f'training {training_time:.3f}s ({training_time/nb_rounds*1e3:.2f}ms per round), '
+          f'scoring {len(test_features)/scoring_time:.0f} points/s, '
+          f'F1 {evaluation.F1_score(test_labels, guesses.tolist()):.4f}')
+
+if __name__ == '__main__':
+    nb_trees = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    boosting_h = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    tree_h = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    file_names = sys.argv[4:] or ['../input_data/cont_eval_data4.csv', '../input_data/cat_eval_data3.csv']
+    for file_name in file_names:
+        benchmark(file_name, nb_trees, boosting_h, tree_h)
@@ -0,0 +1,54 @@
+"""Compare a RandomForest with N Trees trained and scored one after the other
+
+Usage: python bench_forest.py [file] [nb_trees] [height] [workers]
+"""
+import sys
+import time
+
+import numpy as np
+from RandomForest import RandomForest
+from Tree import Tree
+from read_write import load_dataset
+import evaluation
+
+def benchmark(file_name: str, nb_trees: int, h: int, workers: int, training_proportion: float = .8) -> None:
+    features, labels, types = load_dataset(file_name).to_arrays()
+    training_nb = int(len(features)*training_proportion)
+    training_features, training_labels = features[:training_nb], labels[:training_nb]
+    test_features, test_labels = features[training_nb:], labels[training_nb:]
+    rng = np.random.default_rng(0)
+
+    # the baseline: each tree gets its own copy of a bootstrap sample of the
+    # rows, and each test point goes through each tree one at a time
+    start = time.perf_counter()
+    trees = []
+    for _ in range(nb_trees):
+        sample = rng.integers(0, training_nb, training_nb)
+        trees.append(Tree(training_features[sample], training_labels[sample], types, h=h))
+    training_time = time.perf_counter() - start
+    start = time.perf_counter()
+    votes = [sum(tree.decide(point) for tree in trees) for point in test_features]
+    scoring_time = time.perf_counter() - start
+    guesses = [2*vote >= nb_trees for vote in votes]
+    print(f'{nb_trees} sequential trees : training {training_time:.3f}s, '
+          f'scoring {len(test_features)/scoring_time:.0f} points/s, '
+          f'F1 {evaluation.F1_score(test_labels, guesses):.4f}')
+
+    for nb_workers in sorted({1, workers}):
+        start = time.perf_counter()
+        forest = RandomForest(training_features, training_labels, types, nb_trees=nb_trees,
+                              h=h, workers=nb_workers, random_state=0)
+        training_time = time.perf_counter() - start
+        start = time.perf_counter()
+        guesses = forest.decide_batch(test_features)
+        scoring_time = time.perf_counter() - start
+        print(f'forest, {nb_workers} worker(s) : training {training_time:.3f}s, '
+              f'scoring {len(test_features)/scoring_time:.0f} points/s, '
+              f'F1 {evaluation.F1_score(test_labels, guesses.tolist()):.4f}')
+
+if __name__ == '__main__':
+    file_name = sys.argv[1] if len(sys.argv) > 1 else '../input_data/cont_eval_data4.csv'
+    nb_trees = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    h = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    benchmark(file_name, nb_trees, h, workers)
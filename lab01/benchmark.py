@@ -0,0 +1,205 @@
+"""Time the hot paths of the project on synthetic data
+
+Usage: python benchmark.py [--points N] [--features D] [--cardinality K]
+                           [--heights 1 2 3 5] [--repeat R]
+                           [--output results.json] [--baseline baseline.json]
+       python benchmark.py --points N --features D --generate data.csv
+
+The timings (in seconds, the best of `repeat` runs) are written as JSON.
+With a baseline written by a previous run, the ratio of each timing to
+its baseline is reported, and the ones slower than `--tolerance` are
+flagged as regressions.
+"""
+from typing import Callable, Dict, List
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+from PointSet import PointSet, FeaturesTypes
+from Tree import Tree
+from read_write import load_data, load_dataset
+
+_TYPE_CODES = {FeaturesTypes.BOOLEAN: 'b', FeaturesTypes.CLASSES: 'c', FeaturesTypes.REAL: 'r'}
+
+def generate_data(file_name: str,
+                  nb_points: int,
+                  types: List[FeaturesTypes],
+                  cardinality: int = 10,
+                  random_state: int = None) -> None:
+    """Write a synthetic data file in the format of `input_data`
+
+    The first line gives the type of each column ('b', 'c' or 'r', and
+    'l' for the labels, in last position). The labels depend on a
+    noisy combination of the features, so that the trees have real
+    splits to find.
+
+    Parameters
+    ----------
+        file_name : str
+            The name or path of the file to write.
+        nb_points : int
+            The number of points.
+        types : List[FeaturesTypes]
+            The type of each feature.
+        cardinality : int
+            The number of categories of the categorial features.
+        random_state : int
+            The seed of the generator.
+    """
+    rng = np.random.default_rng(random_state)
+    columns = []
+    score = rng.normal(size=nb_points)
+    for feature_type in types:
+        if feature_type == FeaturesTypes.BOOLEAN:
+            column = rng.integers(0, 2, nb_points)
+            score += rng.normal()*column
+        elif feature_type == FeaturesTypes.CLASSES:
+            column = rng.integers(0, cardinality, nb_points)
+            score += rng.normal(size=cardinality)[column]
+        else:
+            # rounded, so that the values repeat as in the real data
+            column = np.round(rng.gamma(2, 50, nb_points), 1)
+            score += rng.normal()*(column - 100)/100
+        columns.append(column)
+    labels = (score > np.median(score)).astype(int)
+
+    with open(file_name, 'w') as dest_file:
+        dest_file.write(','.join([_TYPE_CODES[feature_type] for feature_type in types] + ['l']) + '\n')
+        for row in zip(*columns, labels):
+            dest_file.write(','.join(f'{value:g}' for value in row) + '\n')
+
+def best_time(function: Callable, repeat: int) -> float:
+    """Time a function, in seconds per call
+
+    Fast functions are called in a loop lasting at least 0.2s, and the
+    fastest of `repeat` loops is kept, to damp the noise of the machine.
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number))/number
+
+def run_benchmarks(nb_points: int,
+                   nb_features: int,
+                   cardinality: int,
+                   heights: List[int],
+                   repeat: int,
+                   directory: str) -> Dict[str, float]:
+    """Time each hot path on synthetic data written in `directory`
+
+    Returns
+    -------
+        Dict[str, float]
+            The time of each benchmark, in seconds, except the ones
+            ending in '_per_s', which are throughputs.
+    """
+    all_types = [FeaturesTypes.BOOLEAN, FeaturesTypes.CLASSES, FeaturesTypes.REAL]
+    types = [all_types[j % 3] for j in range(nb_features)]
+    file_name = os.path.join(directory, 'mixed.csv')
+    generate_data(file_name, nb_points, types, cardinality, random_state=0)
+
+    results = {}
+    results['load_data'] = best_time(lambda: load_data(file_name), repeat)
+    results['load_dataset'] = best_time(lambda: load_dataset(file_name, use_cache=False), repeat)
+    load_dataset(file_name)
+    results['load_dataset_cached'] = best_time(lambda: load_dataset(file_name), repeat)
+
+    features, labels, types = load_dataset(file_name).to_arrays()
+    points = PointSet(features, labels, types)
+    results['get_gini'] = best_time(points.get_gini, repeat)
+    results['get_best_gain'] = best_time(points.get_best_gain, repeat)
+    for feature_type in all_types:
+        columns = [j for j, other_type in enumerate(types) if other_type == feature_type]
+        if len(columns) == 0:
+            continue
+        typed_points = PointSet(features[:, columns], labels, [feature_type]*len(columns))
+        results[f'get_best_gain_{feature_type.name.lower()}'] = best_time(typed_points.get_best_gain, repeat)
+
+    for h in heights:
+        results[f'tree_h{h}'] = best_time(lambda: Tree(features, labels, types, h=h), repeat)
+        results[f'tree_level_h{h}'] = best_time(lambda: Tree(features, labels, types, h=h, growth='level'), repeat)
+
+    tree = Tree(features, labels, types, h=max(heights))
+    decide_time = best_time(lambda: [tree.decide(point) for point in features.tolist()], repeat)
+    results['decide_per_s'] = len(labels)/decide_time
+    batch_time = best_time(lambda: tree.decide_batch(features), repeat)
+    results['decide_batch_per_s'] = len(labels)/batch_time
+    return results
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> Dict[str, Dict]:
+    """Compare timings with the ones of a baseline run
+
+    Returns
+    -------
+        Dict[str, Dict]
+            For each benchmark of both runs, the baseline value, the
+            slowdown (above 1 when slower than the baseline, whether the
+            value is a time or a throughput) and whether it exceeds
+            `tolerance`.
+    """
+    comparison = {}
+    for name, value in results.items():
+        if name not in baseline:
+            continue
+        if name.endswith('_per_s'):
+            slowdown = baseline[name]/value
+        else:
+            slowdown = value/baseline[name]
+        comparison[name] = {'baseline': baseline[name],
+                            'slowdown': slowdown,
+                            'regression': slowdown > tolerance}
+    return comparison
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description='Time the hot paths on synthetic data.')
+    parser.add_argument('--points', type=int, default=20000)
+    parser.add_argument('--features', type=int, default=12)
+    parser.add_argument('--cardinality', type=int, default=10)
+    parser.add_argument('--heights', type=int, nargs='+', default=[1, 2, 3, 5])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='JSON file receiving the results')
+    parser.add_argument('--baseline', help='JSON file written by a previous run')
+    parser.add_argument('--tolerance', type=float, default=1.3,
+                        help='slowdown above which a benchmark is a regression')
+    parser.add_argument('--generate', help='only write a synthetic data file with this name')
+    args = parser.parse_args(argv)
+
+    if args.generate is not None:
+        all_types = [FeaturesTypes.BOOLEAN, FeaturesTypes.CLASSES, FeaturesTypes.REAL]
+        generate_data(args.generate, args.points, [all_types[j % 3] for j in range(args.features)],
+                      args.cardinality, random_state=0)
+        return 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = run_benchmarks(args.points, args.features, args.cardinality, args.heights,
+                                 args.repeat, directory)
+    report = {'config': {'points': args.points, 'features': args.features,
+                         'cardinality': args.cardinality, 'heights': args.heights,
+                         'repeat': args.repeat,
+                         'python': platform.python_version(), 'numpy': np.__version__},
+              'results': results}
+
+    nb_regressions = 0
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            report['comparison'] = compare(results, json.load(baseline_file)['results'], args.tolerance)
+        nb_regressions = sum(entry['regression'] for entry in report['comparison'].values())
+
+    for name, value in results.items():
+        line = f'{name:28} {value:14.6g}'
+        if name in report.get('comparison', {}):
+            entry = report['comparison'][name]
+            line += f'   x{entry["slowdown"]:.2f}' + ('  REGRESSION' if entry['regression'] else '')
+        print(line)
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    return 1 if nb_regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
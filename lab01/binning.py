@@ -0,0 +1,122 @@
+from typing import Tuple
+
+import numpy as np
+
+def bin_thresholds(values: np.ndarray, max_bins: int) -> np.ndarray:
+    """Choose the thresholds quantizing a continuous feature into bins
+
+    If the feature takes at most `max_bins` different values, each of
+    them gets its own bin and the thresholds are the midpoints between
+    consecutive values, so that no candidate split is lost. Otherwise
+    the thresholds are picked among these midpoints so that the bins
+    hold roughly the same number of points.
+
+    Parameters
+    ----------
+    values : np.array[float]
+        The values of the feature for every training point.
+    max_bins : int
+        The maximum number of bins.
+
+    Returns
+    -------
+    np.array[float]
+        The thresholds between consecutive bins, in increasing order.
+        There are at most `max_bins - 1` of them.
+    """
+    if max_bins < 2:
+        raise ValueError(f'At least 2 bins are needed, got {max_bins}')
+    distinct, counts = np.unique(values, return_counts=True)
+    if len(distinct) <= max_bins:
+        return (distinct[:-1] + distinct[1:])/2
+
+    # cut after the distinct value at which each quantile is reached
+    cumulated_counts = np.cumsum(counts)
+    targets = cumulated_counts[-1]*np.arange(1, max_bins)/max_bins
+    cuts = np.unique(np.searchsorted(cumulated_counts, targets))
+    cuts = cuts[cuts < len(distinct) - 1]
+    return (distinct[cuts] + distinct[cuts + 1])/2
+
+class FeatureBins:
+    """The quantization of a continuous feature into a few bins
+
+    Attributes
+    ----------
+        thresholds : np.array[float]
+            The thresholds between consecutive bins. A value `x` falls
+            into bin `b` if `thresholds[b-1] <= x < thresholds[b]`.
+        lower_values : np.array[float]
+            The smallest training value of each bin.
+        upper_values : np.array[float]
+            The largest training value of each bin.
+        codes : np.array[int]
+            The bin of each point of `values`, in the smallest unsigned
+            integer type holding all the bins (uint8 up to 256 bins).
+    """
+    def __init__(self, values: np.ndarray, max_bins: int = 255, sample: np.ndarray = None):
+        """
+        Parameters
+        ----------
+        values : np.array[float]
+            The values of the feature for every point.
+        max_bins : int
+            The maximum number of bins.
+        sample : np.array[int]
+            The indices of the training points in `values`, possibly
+            repeated, or None if they are all training points. The bins
+            are chosen from the training points only, but every point
+            gets its code.
+        """
+        training_values = values if sample is None else values[sample]
+        self.thresholds = bin_thresholds(training_values, max_bins)
+        self.codes = self.get_codes(values)
+
+        distinct = np.unique(training_values)
+        distinct_codes = self.get_codes(distinct)
+        starts = np.flatnonzero(np.r_[True, distinct_codes[1:] != distinct_codes[:-1]])
+        ends = np.r_[starts[1:], len(distinct)] - 1
+        self.lower_values = distinct[starts]
+        self.upper_values = distinct[ends]
+
+    @property
+    def nb_bins(self) -> int:
+        return len(self.thresholds) + 1
+
+    def get_codes(self, values: np.ndarray) -> np.ndarray:
+        """Compute the bins into which some values fall
+
+        Parameters
+        ----------
+        values : np.array[float]
+            The values to quantize.
+
+        Returns
+        -------
+        np.array[int]
+            The bin of each value.
+        """
+        # the smallest unsigned type holding every bin: uint8 up to 256 bins
+        dtype = np.min_scalar_type(self.nb_bins - 1)
+        return np.searchsorted(self.thresholds, values, side='right').astype(dtype)
+
+    def get_histogram(self, indices: np.ndarray, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Count the training points, and the positive ones, in each bin
+
+        Parameters
+        ----------
+        indices : np.array[int]
+            The indices of the training points to count.
+        labels : np.array[bool]
+            The labels of all the training points.
+
+        Returns
+        -------
+        np.array[int]
+            The number of points in each bin.
+        np.array[int]
+            The number of points labeled True in each bin.
+        """
+        codes = self.codes[indices]
+        counts = np.bincount(codes, minlength=self.nb_bins)
+        positives = np.bincount(codes[labels[indices].astype(bool)], minlength=self.nb_bins)
+        return counts, positives
@@ -0,0 +1,198 @@
+from typing import Dict, List, Tuple
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PointSet import FeaturesTypes
+from Tree import Tree
+from parallel import SharedArray, attach
+from read_write import load_dataset
+import evaluation
+
+def get_folds(nb_points: int, k: int, shuffle: bool = False, random_state: int = None) -> List[np.ndarray]:
+    """Split the points into k folds of (almost) the same size
+
+    Parameters
+    ----------
+        nb_points : int
+            The number of points.
+        k : int
+            The number of folds.
+        shuffle : bool
+            If False, each fold is a contiguous block of points.
+            Otherwise the points are shuffled first.
+        random_state : int
+            The seed of the shuffle.
+
+    Returns
+    -------
+        List[np.array[int]]
+            The indices of the points of each fold, in increasing order.
+    """
+    if not 2 <= k <= nb_points:
+        raise ValueError(f'Cannot split {nb_points} points into {k} folds')
+    order = np.arange(nb_points)
+    if shuffle:
+        order = np.random.default_rng(random_state).permutation(nb_points)
+    return [np.sort(fold) for fold in np.array_split(order, k)]
+
+def group_by_height(configs: List[dict]) -> List[Tuple[dict, Dict[int, List[int]]]]:
+    """Gather the configurations only differing by their height
+
+    A tree trained with the largest height of a group gives the trees
+    of all the smaller heights (see `Tree.truncate`), so each group is
+    only trained once per fold. The configurations drawing random
+    features (`max_features`) are not gathered: a truncated tree would
+    not have drawn the same features as a tree trained at the smaller
+    height.
+
+    Parameters
+    ----------
+        configs : List[dict]
+            The parameters of Tree to evaluate, `h` included.
+
+    Returns
+    -------
+        List[Tuple[dict, Dict[int, List[int]]]]
+            For each group, the parameters of its largest tree and the
+            positions in `configs` of the configurations of each
+            height.
+    """
+    groups = {}
+    for i, config in enumerate(configs):
+        params = {name: value for name, value in config.items() if name != 'h'}
+        key = tuple(sorted(params.items()))
+        if params.get('max_features') is not None:
+            key += (('h', config.get('h', 1)),)
+        if key not in groups:
+            groups[key] = (params, {})
+        groups[key][1].setdefault(config.get('h', 1), []).append(i)
+    return [(dict(params, h=max(heights)), heights) for params, heights in groups.values()]
+
+def _evaluate_fold(features: np.ndarray,
+                   labels: np.ndarray,
+                   types: List[FeaturesTypes],
+                   orders: np.ndarray,
+                   test_indices: np.ndarray,
+                   params: dict,
+                   heights: List[int]) -> Dict[int, Dict[str, float]]:
+    """Train a tree on all the points but one fold and score it on the fold
+
+    Returns
+    -------
+        Dict[int, Dict[str, float]]
+            The precision, recall and F1-score of the tree cut at each
+            of `heights`.
+    """
+    in_training = np.ones(len(labels), dtype=bool)
+    in_training[test_indices] = False
+    training_indices = np.flatnonzero(in_training)
+    # the global orders filtered to the training points are still sorted
+    real_features = [j for j, feature_type in enumerate(types) if feature_type == FeaturesTypes.REAL]
+    sorted_indices = {j: order[in_training[order]] for j, order in zip(real_features, orders)}
+
+    tree = Tree(features, labels, types, sample=training_indices, sorted_indices=sorted_indices, **params)
+    expected_results = labels[test_indices]
+    guesses = tree.compile().decide_batch_by_height(features[test_indices], heights)
+    scores = {}
+    for h in heights:
+        confusion_matrix = evaluation.ConfusionMatrix(expected_results, guesses[h])
+        precision, recall = confusion_matrix.precision_recall()
+        scores[h] = {'precision': precision,
+                     'recall': recall,
+                     'F1': confusion_matrix.F1_score()}
+    return scores
+
+def _process_evaluate_fold(features_spec: Tuple,
+                           labels_spec: Tuple,
+                           orders_spec: Tuple,
+                           types: List[FeaturesTypes],
+                           test_indices: np.ndarray,
+                           params: dict,
+                           heights: List[int]) -> Dict[int, Dict[str, float]]:
+    """Evaluate a fold in a worker process"""
+    return _evaluate_fold(attach(features_spec), attach(labels_spec), types, attach(orders_spec),
+                          test_indices, params, heights)
+
+def cross_validate(features: List[List[float]],
+                   labels: List[bool],
+                   types: List[FeaturesTypes],
+                   configs: List[dict],
+                   k: int = 5,
+                   workers: int = 1,
+                   shuffle: bool = False,
+                   random_state: int = None) -> List[List[Dict[str, float]]]:
+    """Evaluate several configurations of Tree by k-fold cross-validation
+
+    The points are sorted along each continuous feature once, and the
+    presorted indices of the training points of each fold are derived
+    by filtering this order. Each configuration is trained once per
+    fold with the largest height of its group (see `group_by_height`).
+
+    Parameters
+    ----------
+        features : List[List[float]]
+            The features of the points.
+        labels : List[bool]
+            The labels of the points.
+        types : List[FeaturesTypes]
+            The types of the features.
+        configs : List[dict]
+            The parameters of Tree to evaluate, for instance
+            `{'h': 3, 'min_split_points': 8}`.
+        k : int
+            The number of folds.
+        workers : int
+            If greater than 1, the folds of all the configurations are
+            evaluated by this many processes, attached to a shared-memory
+            copy of the points and of their order.
+        shuffle : bool
+            Whether to shuffle the points before making the folds.
+        random_state : int
+            The seed of the shuffle.
+
+    Returns
+    -------
+        List[List[Dict[str, float]]]
+            For each configuration and each fold, the precision, recall
+            and F1-score of the tree trained on the other folds.
+    """
+    features = np.asarray(features, dtype=float, order='F').reshape((len(labels), len(types)), order='F')
+    labels = np.asarray(labels, dtype=bool)
+    real_features = [j for j, feature_type in enumerate(types) if feature_type == FeaturesTypes.REAL]
+    orders = np.empty((len(real_features), len(labels)), dtype=np.intp)
+    for row, j in enumerate(real_features):
+        orders[row] = np.argsort(features[:, j], kind='stable')
+    folds = get_folds(len(labels), k, shuffle, random_state)
+    groups = group_by_height(configs)
+
+    tasks = [(test_indices, params, sorted(heights)) for params, heights in groups for test_indices in folds]
+    if workers <= 1:
+        scores = [_evaluate_fold(features, labels, types, orders, *task) for task in tasks]
+    else:
+        shared = [SharedArray(features, order='F'), SharedArray(labels), SharedArray(orders)]
+        try:
+            with ProcessPoolExecutor(workers) as pool:
+                futures = [pool.submit(_process_evaluate_fold, shared[0].spec, shared[1].spec, shared[2].spec,
+                                       types, *task)
+                           for task in tasks]
+                scores = [future.result() for future in futures]
+        finally:
+            for array in shared:
+                array.release()
+
+    results = [None]*len(configs)
+    for g, (_, heights) in enumerate(groups):
+        group_scores = scores[g*k:(g + 1)*k]
+        for h, positions in heights.items():
+            for i in positions:
+                results[i] = [fold_scores[h] for fold_scores in group_scores]
+    return results
+
+def cross_validate_file(file_name: str, configs: List[dict], **kwargs) -> List[List[Dict[str, float]]]:
+    """Load a data file once and cross-validate several configurations on it
+
+    The keyword arguments are the ones of `cross_validate`.
+    """
+    features, labels, types = load_dataset(file_name).to_arrays()
+    return cross_validate(features, labels, types, configs, **kwargs)
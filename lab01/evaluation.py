@@ -1,5 +1,89 @@
 from typing import List
 
+import numpy as np
+
+class ConfusionMatrix:
+    """The counts of right and wrong predictions, accumulated batch by batch
+
+    Attributes
+    ----------
+        matrix : np.array[int]
+            2x2 array, `matrix[e, a]` being the number of predictions
+            `a` made for points whose true result is `e` (0 for False,
+            1 for True): [[TN, FP], [FN, TP]].
+    """
+    def __init__(self, expected_results: List[bool] = None, actual_results: List[bool] = None):
+        """
+        Parameters
+        ----------
+        expected_results : List[bool]
+            If not None, the true results of a first batch.
+        actual_results : List[bool]
+            The predicted results of this batch.
+        """
+        self.matrix = np.zeros((2, 2), dtype=np.int64)
+        if expected_results is not None:
+            self.update(expected_results, actual_results)
+
+    def update(self, expected_results: List[bool], actual_results: List[bool]) -> None:
+        """Count a batch of predictions, in one vectorized pass
+
+        Parameters
+        ----------
+        expected_results : List[bool]
+            The true results of the batch.
+        actual_results : List[bool]
+            The predicted results of the batch.
+        """
+        expected = np.asarray(expected_results) == True
+        actual = np.asarray(actual_results) == True
+        self.matrix += np.bincount(2*expected + actual, minlength=4).reshape(2, 2)
+
+    @property
+    def TP(self) -> int:
+        return int(self.matrix[1, 1])
+
+    @property
+    def FP(self) -> int:
+        return int(self.matrix[0, 1])
+
+    @property
+    def FN(self) -> int:
+        return int(self.matrix[1, 0])
+
+    @property
+    def TN(self) -> int:
+        return int(self.matrix[0, 0])
+
+    def precision_recall(self) -> (float, float):
+        """Compute the precision and recall of the predictions counted so far
+
+        Returns
+        -------
+            float
+                The precision, or 0 if there is no true positive.
+            float
+                The recall, or 0 if there is no true positive.
+        """
+        TP = self.TP
+        if TP == 0:
+            return 0, 0
+        return TP/(TP + self.FP), TP/(TP + self.FN)
+
+    def F1_score(self) -> float:
+        """Compute the F1-score of the predictions counted so far"""
+        precision, recall = self.precision_recall()
+        if precision == 0 and recall == 0:
+            return 0
+        return 2*precision*recall/(precision+recall)
+
+    def accuracy(self) -> float:
+        """Compute the proportion of right predictions counted so far"""
+        total = int(self.matrix.sum())
+        if total == 0:
+            return 0
+        return (self.TP + self.TN)/total
+
 def precision_recall(expected_results: List[bool], actual_results: List[bool]) -> (float, float):
     """Compute the precision and recall of a series of predictions
 
@@ -18,25 +102,8 @@ def precision_recall(expected_results: List[bool], actual_results: List[bool]) -
         float
             The recall of the predicted results.
     """
+    return ConfusionMatrix(expected_results, actual_results).precision_recall()
 
-    TP = 0
-    FP = 0
-    FN = 0
-    for i in range(len(expected_results)):
-        if expected_results[i] == True and actual_results[i] == True:
-            TP += 1
-        elif expected_results[i] == False and actual_results[i] == True:
-            FP += 1
-        elif expected_results[i] == True and actual_results[i] == False:
-            FN += 1
-
-    if TP == 0:
-        return 0, 0
-    precision = TP/(TP+FP)
-    recall = TP/(TP+FN)
-    
-    return precision, recall
-    
     # raise NotImplementedError('Implement this method for Question 3')
 
 def F1_score(expected_results: List[bool], actual_results: List[bool]) -> float:
@@ -55,10 +122,5 @@ def F1_score(expected_results: List[bool], actual_results: List[bool]) -> float:
         float
             The F1-score of the predicted results.
     """
-    
-    precision, recall = precision_recall(expected_results, actual_results)
-    if precision == 0 and recall == 0:
-        return 0
-    F1_score = 2*precision*recall/(precision+recall)
-    return F1_score
+    return ConfusionMatrix(expected_results, actual_results).F1_score()
     # raise NotImplementedError('Implement this method for Question 3')
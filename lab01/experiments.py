@@ -0,0 +1,203 @@
+"""Run the exercises as declarative jobs, sharing the loaded files
+
+A job is a list of files, a task applied to each of them, the
+parameters of the task, and the results file receiving one line per
+file. The jobs are split into one unit per (job, file); the units are
+run by a pool of processes, each keeping the files it loaded in an LRU
+cache, and the results of each job are written by `write_results`
+once all its units are done.
+"""
+from typing import Dict, List, Tuple
+
+import csv
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PointSet import PointSet
+from Tree import Tree
+from read_write import load_dataset, write_results
+from profiling import TrainingProfiler
+import evaluation
+
+files_eval =\
+[
+    ['../input_data/eval_data1.csv', '../input_data/eval_data2.csv'],
+    ['../input_data/eval_data1.csv', '../input_data/eval_data2.csv'],
+    ['../input_data/exo4_eval1.csv', '../input_data/exo4_eval2.csv'],
+    ['../input_data/eval_data1.csv', '../input_data/eval_data2.csv'],
+    ['../input_data/eval_data1.csv', '../input_data/eval_data2.csv'],
+    ['../input_data/cat_eval_data1.csv', '../input_data/cat_eval_data2.csv', '../input_data/cat_eval_data3.csv'],
+    ['../input_data/cont_eval_data1.csv','../input_data/cont_eval_data2.csv','../input_data/cont_eval_data3.csv'],
+    ['../input_data/cont_eval_data1.csv','../input_data/cont_eval_data2.csv','../input_data/cont_eval_data3.csv'],
+    ['../input_data/cont_eval_data2.csv','../input_data/cont_eval_data3.csv',],
+    ['../input_data/cont_eval_data4.csv'],
+]
+
+files_debug =\
+[
+    ['../input_data/debug_data1.csv', '../input_data/debug_data2.csv', '../input_data/debug_data3.csv'],
+    ['../input_data/debug_data1.csv', '../input_data/debug_data2.csv', '../input_data/debug_data3.csv'],
+    ['../input_data/exo4_debug1.csv', '../input_data/exo4_debug2.csv'],
+    ['../input_data/debug_data1.csv', '../input_data/debug_data2.csv', '../input_data/debug_data3.csv'],
+    ['../input_data/debug_data1.csv', '../input_data/debug_data2.csv', '../input_data/debug_data3.csv'],
+    ['../input_data/cat_debug_data1.csv', '../input_data/cat_debug_data2.csv', '../input_data/cat_debug_data3.csv'],
+    ['../input_data/cont_debug_data1.csv','../input_data/cont_debug_data2.csv','../input_data/cont_debug_data3.csv'],
+    ['../input_data/cont_debug_data1.csv','../input_data/cont_debug_data2.csv','../input_data/cont_debug_data3.csv'],
+    ['../input_data/cont_debug_data2.csv','../input_data/cont_debug_data3.csv',],
+    ['../input_data/cont_debug_data4.csv',],
+]
+
+# the task and its parameters for each exercise
+exercices =\
+{
+    1: ('gini', {}),
+    2: ('best_gain', {}),
+    3: ('scores', {}),
+    4: ('tree_F1', {}),
+    5: ('tree_F1', {'h': 2}),
+    6: ('tree_F1', {'h': 2}),
+    7: ('best_threshold', {}),
+    8: ('tree_F1', {'h': 3}),
+    9: ('tree_F1', {'h': 5, 'min_split_points': 8}),
+    10: ('tree_F1', {'h': 5, 'min_split_points': 8}),
+}
+
+@functools.lru_cache(maxsize=32)
+def load_points(file_name: str):
+    """Load the points of a data file, once per process while it stays in the cache
+
+    The arrays are shared by all the tasks using the file, which must
+    not modify them.
+    """
+    return load_dataset(file_name).to_arrays()
+
+@functools.lru_cache(maxsize=32)
+def load_guesses(file_name: str) -> Tuple[List[bool], List[bool]]:
+    """Load the expected and the guessed labels of a file of exercise 3"""
+    expected_res = []
+    true_res = []
+    with open(file_name) as csv_file:
+        for line in csv.reader(csv_file, delimiter=','):
+            expected_res += [line[0] == '1']
+            true_res += [line[1] == '1']
+    return expected_res, true_res
+
+def get_gini(file_name: str) -> List:
+    features, labels, types = load_points(file_name)
+    return [PointSet(features, labels, types).get_gini()]
+
+def get_best_gain(file_name: str) -> List:
+    features, labels, types = load_points(file_name)
+    return list(PointSet(features, labels, types).get_best_gain())
+
+def get_scores(file_name: str) -> List:
+    confusion_matrix = evaluation.ConfusionMatrix(*load_guesses(file_name))
+    precision, recall = confusion_matrix.precision_recall()
+    return [precision, recall, confusion_matrix.F1_score()]
+
+def get_tree_F1(file_name: str, profile: bool = False, training_proportion: float = .8, **tree_params) -> List:
+    """Train a tree on the first points of a file and score it on the other ones"""
+    features, labels, types = load_points(file_name)
+    training_nb = int(len(features)*training_proportion)
+    profiler = TrainingProfiler() if profile else None
+    tree = Tree(features[:training_nb], labels[:training_nb], types, profiler=profiler, **tree_params)
+    if profiler is not None:
+        print(f'\n{file_name}\n{profiler.format_report()}', flush=True)
+    expected_results = labels[training_nb:]
+    actual_results = tree.decide_batch(features[training_nb:]).tolist()
+    return [evaluation.F1_score(expected_results, actual_results)]
+
+def get_best_threshold(file_name: str) -> List:
+    features, labels, types = load_points(file_name)
+    points = PointSet(features, labels, types)
+    return list(points.get_best_gain()) + [points.get_best_threshold()]
+
+tasks =\
+{
+    'gini': get_gini,
+    'best_gain': get_best_gain,
+    'scores': get_scores,
+    'tree_F1': get_tree_F1,
+    'best_threshold': get_best_threshold,
+}
+
+def get_jobs(modes: List[str] = ('debug', 'eval'), exercice_ids: List[int] = None, **extra_params) -> List[dict]:
+    """Describe the jobs of some exercises
+
+    Parameters
+    ----------
+        modes : List[str]
+            'debug' and/or 'eval'.
+        exercice_ids : List[int]
+            The exercises, by default all of them.
+        extra_params : dict
+            Parameters added to the ones of the tree tasks, for
+            instance `profile=True`.
+
+    Returns
+    -------
+        List[dict]
+            For each (mode, exercise), its `files`, `task`, `params` and
+            `dest_file`.
+    """
+    jobs = []
+    for mode in modes:
+        files = files_eval if mode == 'eval' else files_debug
+        for exercice in exercice_ids or sorted(exercices):
+            task, params = exercices[exercice]
+            if task == 'tree_F1':
+                params = dict(params, **extra_params)
+            jobs.append({'files': files[exercice - 1],
+                         'task': task,
+                         'params': params,
+                         'dest_file': f'results/achieved/exercice{exercice}_{mode}.csv'})
+    return jobs
+
+def _run_unit(task: str, file_name: str, params: dict) -> List:
+    return tasks[task](file_name, **params)
+
+def run_jobs(jobs: List[dict], workers: int = None) -> Dict[str, List[List]]:
+    """Run jobs and write their results
+
+    Parameters
+    ----------
+        jobs : List[dict]
+            The jobs, as returned by `get_jobs`.
+        workers : int
+            The number of processes running the units of the jobs, by
+            default the number of processors; 1 runs them in the calling
+            process.
+
+    Returns
+    -------
+        Dict[str, List[List]]
+            The results written into each results file.
+    """
+    units = [(j, i, job['task'], file_name, job['params'])
+             for j, job in enumerate(jobs) for i, file_name in enumerate(job['files'])]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(units))
+
+    rows = {}
+    if workers <= 1:
+        for j, i, task, file_name, params in units:
+            rows[j, i] = _run_unit(task, file_name, params)
+    else:
+        # the binary caches of the data files are written once, here, and
+        # only mapped by the workers
+        for file_name in {unit[3] for unit in units if unit[2] != 'scores'}:
+            load_dataset(file_name)
+        # the largest files first, so that they do not end the run alone
+        units.sort(key=lambda unit: -os.path.getsize(unit[3]))
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {(j, i): pool.submit(_run_unit, task, file_name, params)
+                       for j, i, task, file_name, params in units}
+            rows = {key: future.result() for key, future in futures.items()}
+
+    results = {}
+    for j, job in enumerate(jobs):
+        results[job['dest_file']] = [rows[j, i] for i in range(len(job['files']))]
+        write_results(results[job['dest_file']], job['dest_file'])
+    return results
@@ -0,0 +1,507 @@
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from PointSet import FeaturesTypes, gini_from_counts, split_gains
+from binning import FeatureBins
+
+def get_key_layout(types: List[FeaturesTypes],
+                   categories: Dict[int, np.ndarray],
+                   edges: Dict[int, np.ndarray]) -> Tuple[List[int], np.ndarray, np.ndarray]:
+    """Lay out the keys counted for the discrete features of a node
+
+    The discrete features are the boolean ones (2 keys), the categorial
+    ones (one key per category) and the binned continuous ones (one key
+    per bin). The keys of a feature follow the ones of the previous
+    discrete feature.
+
+    Returns
+    -------
+        List[int]
+            The discrete features.
+        np.array[int]
+            The number of keys of each of them.
+        np.array[int]
+            The first key of each of them.
+    """
+    discrete = [j for j, feature_type in enumerate(types)
+                if feature_type != FeaturesTypes.REAL or j in edges]
+    nb_slots = []
+    for j in discrete:
+        if types[j] == FeaturesTypes.BOOLEAN:
+            nb_slots.append(2)
+        elif types[j] == FeaturesTypes.CLASSES:
+            nb_slots.append(len(categories[j]))
+        else:
+            nb_slots.append(len(edges[j]) + 1)
+    nb_slots = np.array(nb_slots, dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(nb_slots)[:-1])).astype(np.int64)
+    return discrete, nb_slots, offsets
+
+def get_keys(features: np.ndarray,
+             rows: np.ndarray,
+             types: List[FeaturesTypes],
+             discrete: List[int],
+             offsets: np.ndarray,
+             categories: Dict[int, np.ndarray],
+             edges: Dict[int, np.ndarray]) -> np.ndarray:
+    """Compute the keys of the values of the discrete features of some points
+
+    Returns
+    -------
+        np.array[int]
+            (len(rows), len(discrete)) array of the key of each point
+            for each discrete feature (see `get_key_layout`).
+    """
+    keys = np.empty((len(rows), len(discrete)), dtype=np.int64)
+    for d, j in enumerate(discrete):
+        values = features[rows, j]
+        if types[j] == FeaturesTypes.BOOLEAN:
+            keys[:, d] = values != 0
+        elif types[j] == FeaturesTypes.CLASSES:
+            keys[:, d] = np.searchsorted(categories[j], values)
+        else:
+            # as FeatureBins.get_codes
+            keys[:, d] = np.searchsorted(edges[j], values, side='right')
+    return keys + offsets
+
+class Level:
+    """The nodes at one depth of a tree grown level by level
+
+    Attributes
+    ----------
+        decision : np.array[bool]
+            The majority label of each node.
+        feature : np.array[int]
+            The feature along which each node splits, or -1 for a leaf.
+        threshold : np.array[float]
+            The category (one-vs-rest CLASSES) or the threshold (REAL) of
+            the split of each node, NaN otherwise.
+        categories : List[np.array[float]]
+            The categories going to the first child, for the nodes
+            splitting a categorial feature by subset, None otherwise.
+        first_child : np.array[int]
+            The index, in the next level, of the first child of each
+            node (the second one follows it), or -1 for a leaf.
+    """
+    def __init__(self, decision: np.ndarray):
+        nb_nodes = len(decision)
+        self.decision = decision
+        self.feature = np.full(nb_nodes, -1)
+        self.threshold = np.full(nb_nodes, np.nan)
+        self.categories = [None]*nb_nodes
+        self.first_child = np.full(nb_nodes, -1)
+
+class LevelCounts:
+    """The label counts of the nodes of a level, which add up over shards of points
+
+    Attributes
+    ----------
+        counts : np.array[int]
+            The number of points of each node.
+        positives : np.array[int]
+            The number of positive points of each node.
+        key_counts : np.array[int]
+            (nb_nodes, nb_keys) array of the number of points of each
+            node with each key (see `get_key_layout`).
+        key_positives : np.array[int]
+            Likewise for the positive points.
+        first_seen : Dict[int, np.array[int]]
+            For the categorial features split one category against the
+            others, a (nb_nodes, nb_categories) array of the position of
+            the first point of each node in each category.
+    """
+    def __init__(self, counts, positives, key_counts, key_positives, first_seen):
+        self.counts = counts
+        self.positives = positives
+        self.key_counts = key_counts
+        self.key_positives = key_positives
+        self.first_seen = first_seen
+
+    def add(self, other: 'LevelCounts') -> None:
+        """Merge the counts of another shard of points into these ones"""
+        self.counts += other.counts
+        self.positives += other.positives
+        self.key_counts += other.key_counts
+        self.key_positives += other.key_positives
+        for j, first_seen in other.first_seen.items():
+            np.minimum(self.first_seen[j], first_seen, out=self.first_seen[j])
+
+class LevelCounter:
+    """The training points of a tree grown level by level, or a shard of them
+
+    It knows the node of each of its points in the current level, counts
+    them, and sends them to the children of their node once the splits
+    of the level are chosen.
+
+    Attributes
+    ----------
+        rows : np.array[int]
+            The indices of the points in `features`, possibly repeated.
+        codes : np.array[int]
+            For each row and each discrete feature, the key of its
+            value (see `get_key_layout`).
+        node_of_row : np.array[int]
+            The node of each row in the current level, -1 once it
+            reached a leaf.
+        positions : np.array[int]
+            The rows still in the current level, in increasing order.
+        grouped : Dict[int, np.array[int]]
+            For each exact continuous feature, the rows of the current
+            level sorted by node, and by value within each node.
+        first_position : int
+            The position of the first row among all the training points,
+            when the counter only holds a shard of them.
+    """
+    def __init__(self,
+                 features: np.ndarray,
+                 labels: np.ndarray,
+                 types: List[FeaturesTypes],
+                 rows: np.ndarray,
+                 categories: Dict[int, np.ndarray],
+                 edges: Dict[int, np.ndarray],
+                 classes_split: str = 'one_vs_rest',
+                 first_position: int = 0):
+        """
+        Parameters
+        ----------
+        features : np.array[float]
+            2D array containing the features of the points.
+        labels : np.array[bool]
+            The labels of the points.
+        types : List[FeaturesTypes]
+            The types of the features.
+        rows : np.array[int]
+            The indices of the training points.
+        categories : Dict[int, np.array[float]]
+            The sorted categories of each categorial feature, among all
+            the training points.
+        edges : Dict[int, np.array[float]]
+            The thresholds between the bins of each binned continuous
+            feature; the other continuous features are exact.
+        classes_split : str
+            'one_vs_rest' or 'subset', see Tree.
+        first_position : int
+            The position of the first row among all the training points.
+        """
+        self.features = features
+        self.types = types
+        self.rows = rows
+        self.row_labels = np.asarray(labels)[rows].astype(bool)
+        self.classes_split = classes_split
+        self.first_position = first_position
+        self.discrete, self.nb_slots, self.offsets = get_key_layout(types, categories, edges)
+        self.nb_keys = int(self.nb_slots.sum())
+        self.exact = [j for j, feature_type in enumerate(types)
+                      if feature_type == FeaturesTypes.REAL and j not in edges]
+
+        self.codes = get_keys(features, rows, types, self.discrete, self.offsets, categories, edges)
+
+        self.node_of_row = np.zeros(len(rows), dtype=np.int64)
+        self.positions = np.arange(len(rows))
+        self.grouped = {j: np.argsort(features[rows, j], kind='stable') for j in self.exact}
+
+    def count(self, nb_nodes: int) -> LevelCounts:
+        """Count the points of each node of the current level, in total and by key"""
+        nodes = self.node_of_row[self.positions]
+        labels = self.row_labels[self.positions]
+        counts = np.bincount(nodes, minlength=nb_nodes)
+        positives = np.bincount(nodes[labels], minlength=nb_nodes)
+        # one bincount for all the discrete features of all the nodes
+        keys = nodes[:, None]*self.nb_keys + self.codes[self.positions]
+        key_counts = np.bincount(keys.ravel(), minlength=nb_nodes*self.nb_keys).reshape(nb_nodes, -1)
+        key_positives = np.bincount(keys[labels].ravel(), minlength=nb_nodes*self.nb_keys).reshape(nb_nodes, -1)
+
+        first_seen = {}
+        if self.classes_split == 'one_vs_rest':
+            for d, j in enumerate(self.discrete):
+                if self.types[j] != FeaturesTypes.CLASSES:
+                    continue
+                nb_categories = self.nb_slots[d]
+                seen = np.full(nb_nodes*nb_categories, np.iinfo(np.int64).max)
+                np.minimum.at(seen, nodes*nb_categories + self.codes[self.positions, d] - self.offsets[d],
+                              self.first_position + self.positions)
+                first_seen[j] = seen.reshape(nb_nodes, nb_categories)
+        return LevelCounts(counts, positives, key_counts, key_positives, first_seen)
+
+    def find_exact_splits(self,
+                          nb_nodes: int,
+                          level_counts: LevelCounts,
+                          min_split_points: int,
+                          gains: np.ndarray,
+                          thresholds: np.ndarray) -> None:
+        """Find the best threshold of every node along each exact continuous feature
+
+        The gains and thresholds of these features are written into the
+        (nb_nodes, nb_features) arrays `gains` and `thresholds`.
+        """
+        counts, positives = level_counts.counts, level_counts.positives
+        gini = gini_from_counts(counts, positives)
+        for j in self.exact:
+            order = self.grouped[j]
+            values = self.features[self.rows[order], j]
+            order_nodes = self.node_of_row[order]
+            # between two different values of the same node
+            candidates = np.flatnonzero((order_nodes[:-1] == order_nodes[1:]) & (values[:-1] != values[1:]))
+            if len(candidates) == 0:
+                continue
+            cumulated_positives = np.cumsum(self.row_labels[order])
+            starts = np.searchsorted(order_nodes, np.arange(nb_nodes))
+            positives_before = np.where(starts > 0, cumulated_positives[starts - 1], 0)
+            candidate_nodes = order_nodes[candidates]
+            candidate_gains = split_gains(gini[candidate_nodes],
+                                          candidates + 1 - starts[candidate_nodes],
+                                          cumulated_positives[candidates] - positives_before[candidate_nodes],
+                                          counts[candidate_nodes], positives[candidate_nodes], min_split_points)
+            best_gains = np.full(nb_nodes, -np.inf)
+            np.maximum.at(best_gains, candidate_nodes, candidate_gains)
+            # the first candidate of each node reaching its best gain
+            reaching = np.flatnonzero((candidate_gains == best_gains[candidate_nodes]) & (candidate_gains > -np.inf))
+            split_nodes, first = np.unique(candidate_nodes[reaching], return_index=True)
+            best = candidates[reaching[first]]
+            gains[split_nodes, j] = best_gains[split_nodes]
+            thresholds[split_nodes, j] = (values[best] + values[best + 1])/2
+
+    def split(self, level: Level, left_codes: Dict[int, np.ndarray]) -> None:
+        """Send the points of the split nodes of `level` to their child, and drop the other ones"""
+        nodes = self.node_of_row[self.positions]
+        kept = level.feature[nodes] >= 0
+        goes_left = np.zeros(len(self.positions), dtype=bool)
+        for j in np.unique(level.feature[nodes[kept]]):
+            selected = np.flatnonzero(level.feature[nodes] == j)
+            values = self.features[self.rows[self.positions[selected]], j]
+            if self.types[j] == FeaturesTypes.BOOLEAN:
+                goes_left[selected] = values == 0
+            elif j in left_codes:
+                d = self.discrete.index(j)
+                codes = self.codes[self.positions[selected], d] - self.offsets[d]
+                goes_left[selected] = left_codes[j][nodes[selected], codes]
+            elif self.types[j] == FeaturesTypes.CLASSES:
+                goes_left[selected] = values == level.threshold[nodes[selected]]
+            else:
+                goes_left[selected] = values < level.threshold[nodes[selected]]
+        self.node_of_row[self.positions[~kept]] = -1
+        self.node_of_row[self.positions[kept]] = level.first_child[nodes[kept]] + ~goes_left[kept]
+        self.positions = self.positions[kept]
+        # a stable sort by child keeps each child sorted by value
+        small = np.min_scalar_type(max(2*np.count_nonzero(level.feature >= 0), 1))
+        for j, order in self.grouped.items():
+            order = order[self.node_of_row[order] >= 0]
+            self.grouped[j] = order[np.argsort(self.node_of_row[order].astype(small), kind='stable')]
+
+class LevelWiseGrower:
+    """Grows a tree one level at a time, with a few array passes per level
+
+    Every training point carries the ID of its node in the current
+    level. The label counts per (node, value) of all the boolean,
+    categorial and binned features come from a single bincount over
+    combined keys, and the exact continuous features are scanned in an
+    order grouped by node and sorted by value within each node, which
+    is kept up to date with one stable sort of small node IDs per level.
+    All the splits of a level are then chosen at once.
+
+    The points are held by a LevelCounter, or by several ones each
+    holding a shard of them (see `sharding.ShardPool`), whose counts
+    add up. The candidates, the tie-breaking and the arithmetic are the
+    ones of PointSet, so the tree is the one grown depth-first node by
+    node.
+
+    Attributes
+    ----------
+        categories : Dict[int, np.array[float]]
+            The sorted categories of each categorial feature.
+        bins : Dict[int, FeatureBins]
+            The bins of the binned continuous features.
+        edges : Dict[int, np.array[float]]
+            The thresholds between these bins.
+    """
+    def __init__(self,
+                 features: np.ndarray,
+                 labels: np.ndarray,
+                 types: List[FeaturesTypes],
+                 rows: np.ndarray,
+                 min_split_points: int = 1,
+                 bins: Dict[int, FeatureBins] = None,
+                 classes_split: str = 'one_vs_rest',
+                 draw_features: Callable[[], np.ndarray] = None):
+        """
+        Parameters
+        ----------
+        features : np.array[float]
+            2D array containing the features of all the points.
+        labels : np.array[bool]
+            The labels of all the points.
+        types : List[FeaturesTypes]
+            The types of the features.
+        rows : np.array[int]
+            The indices of the training points.
+        min_split_points : int
+            The minimum number of points of each child of a split.
+        bins : Dict[int, FeatureBins]
+            The bins of the continuous features, or None.
+        classes_split : str
+            'one_vs_rest' or 'subset', see Tree.
+        draw_features : Callable[[], np.array[int]]
+            If not None, draws the features considered by each node,
+            called for the nodes in breadth-first order.
+        """
+        self.features = features
+        self.labels = labels
+        self.types = types
+        self.rows = rows
+        self.min_split_points = min_split_points
+        self.classes_split = classes_split
+        self.draw_features = draw_features
+        self.bins = bins if bins is not None else {}
+        self.edges = {j: feature_bins.thresholds for j, feature_bins in self.bins.items()}
+        self.categories = {j: np.unique(features[rows, j]) for j, feature_type in enumerate(types)
+                           if feature_type == FeaturesTypes.CLASSES}
+        self.discrete, self.nb_slots, self.offsets = get_key_layout(types, self.categories, self.edges)
+
+    def make_counter(self,
+                     features: np.ndarray,
+                     labels: np.ndarray,
+                     rows: np.ndarray,
+                     first_position: int = 0) -> LevelCounter:
+        """Make a counter of (a shard of) the training points, sharing the keys of this grower"""
+        return LevelCounter(features, labels, self.types, rows, self.categories, self.edges,
+                            self.classes_split, first_position)
+
+    def grow(self, h: int, counter: LevelCounter = None) -> List[Level]:
+        """Grow the tree down to height `h`
+
+        Parameters
+        ----------
+        h : int
+            The maximum height of the tree.
+        counter : LevelCounter
+            The holder of the training points, by default a counter of
+            all of them in this process.
+
+        Returns
+        -------
+            List[Level]
+                The nodes of each depth, from the root.
+        """
+        if counter is None:
+            counter = self.make_counter(self.features, self.labels, self.rows)
+        nb_nodes = 1
+        levels = []
+        for depth in range(h + 1):
+            level_counts = counter.count(nb_nodes)
+            counts, positives = level_counts.counts, level_counts.positives
+            level = Level(positives >= counts - positives)
+            levels.append(level)
+            if depth == h:
+                break
+
+            gains, thresholds, left_codes = self._find_splits(nb_nodes, level_counts)
+            counter.find_exact_splits(nb_nodes, level_counts, self.min_split_points, gains, thresholds)
+            if self.draw_features is not None:
+                drawn = np.zeros(gains.shape, dtype=bool)
+                for i in range(nb_nodes):
+                    drawn[i, self.draw_features()] = True
+                gains[~drawn] = -np.inf
+            # the first feature wins the ties, and only positive gains split
+            best = np.argmax(gains, axis=1)
+            is_split = gains[np.arange(nb_nodes), best] > 0
+            if not is_split.any():
+                break
+
+            split_nodes = np.flatnonzero(is_split)
+            level.feature[split_nodes] = best[split_nodes]
+            level.first_child[split_nodes] = 2*np.arange(len(split_nodes))
+            for i in split_nodes:
+                j = best[i]
+                if j in left_codes:
+                    level.categories[i] = self.categories[j][left_codes[j][i]]
+                elif self.types[j] != FeaturesTypes.BOOLEAN:
+                    level.threshold[i] = thresholds[i, j]
+            counter.split(level, left_codes)
+            nb_nodes = 2*len(split_nodes)
+        return levels
+
+    def _find_splits(self, nb_nodes: int, level_counts: LevelCounts):
+        """Compute the best split of every node of a level along every discrete feature
+
+        Returns
+        -------
+            np.array[float]
+                (nb_nodes, nb_features) array of the best Gini gains,
+                -inf where there is no valid split.
+            np.array[float]
+                (nb_nodes, nb_features) array of the categories or
+                thresholds of these splits.
+            Dict[int, np.array[bool]]
+                For the categorial features split by subset, a
+                (nb_nodes, nb_categories) array telling which
+                categories go to the first child of each node.
+        """
+        msp = self.min_split_points
+        counts, positives = level_counts.counts, level_counts.positives
+        gini = gini_from_counts(counts, positives)
+        gains = np.full((nb_nodes, len(self.types)), -np.inf)
+        thresholds = np.full((nb_nodes, len(self.types)), np.nan)
+        left_codes = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for d, j in enumerate(self.discrete):
+                slots = slice(self.offsets[d], self.offsets[d] + self.nb_slots[d])
+                left_counts = level_counts.key_counts[:, slots]
+                left_positives = level_counts.key_positives[:, slots]
+                if self.types[j] == FeaturesTypes.BOOLEAN:
+                    gains[:, j] = split_gains(gini, left_counts[:, 0], left_positives[:, 0],
+                                              counts, positives, msp)
+                elif self.types[j] == FeaturesTypes.CLASSES and self.classes_split == 'subset':
+                    gains[:, j], left_codes[j] = self._find_subset_splits(gini, left_counts, left_positives,
+                                                                          counts, positives)
+                elif self.types[j] == FeaturesTypes.CLASSES:
+                    gains[:, j], thresholds[:, j] = self._find_category_splits(j, level_counts.first_seen[j], gini,
+                                                                               left_counts, left_positives,
+                                                                               counts, positives)
+                else:
+                    gains[:, j], thresholds[:, j] = self._find_bin_splits(j, gini, left_counts, left_positives,
+                                                                          counts, positives)
+        return gains, thresholds, left_codes
+
+    def _find_category_splits(self, j, first_seen, gini, left_counts, left_positives, counts, positives):
+        """One category against the others, the first one seen by the node winning the ties"""
+        category_gains = split_gains(gini[:, None], left_counts, left_positives,
+                                     counts[:, None], positives[:, None], self.min_split_points)
+        best_gains = category_gains.max(axis=1)
+        reaching = (category_gains == best_gains[:, None]) & (category_gains > -np.inf)
+        best = np.argmin(np.where(reaching, first_seen, np.iinfo(np.int64).max), axis=1)
+        return best_gains, self.categories[j][best]
+
+    def _find_subset_splits(self, gini, left_counts, left_positives, counts, positives):
+        """The categories sorted by rate of positive points, split between two prefixes"""
+        nb_nodes, nb_categories = left_counts.shape
+        left_codes = np.zeros((nb_nodes, nb_categories), dtype=bool)
+        if nb_categories < 2:
+            return np.full(nb_nodes, -np.inf), left_codes
+        # the categories absent from a node go last
+        rates = np.where(left_counts > 0, left_positives/left_counts, np.inf)
+        order = np.argsort(rates, axis=1, kind='stable')
+        prefix_counts = np.cumsum(np.take_along_axis(left_counts, order, axis=1), axis=1)[:, :-1]
+        prefix_positives = np.cumsum(np.take_along_axis(left_positives, order, axis=1), axis=1)[:, :-1]
+        prefix_gains = split_gains(gini[:, None], prefix_counts, prefix_positives,
+                                   counts[:, None], positives[:, None], self.min_split_points)
+        nb_present = np.count_nonzero(left_counts, axis=1)
+        prefix_gains[np.arange(nb_categories - 1) >= (nb_present - 1)[:, None]] = -np.inf
+        best = np.argmax(prefix_gains, axis=1)
+        np.put_along_axis(left_codes, order, np.arange(nb_categories) <= best[:, None], axis=1)
+        return prefix_gains[np.arange(nb_nodes), best], left_codes
+
+    def _find_bin_splits(self, j, gini, left_counts, left_positives, counts, positives):
+        """Between two consecutive non-empty bins, as in PointSet._scan_histogram"""
+        nb_nodes, nb_bins = left_counts.shape
+        bins = self.bins[j]
+        nonempty = left_counts > 0
+        last_nonempty = nb_bins - 1 - np.argmax(nonempty[:, ::-1], axis=1)
+        bin_range = np.arange(nb_bins)
+        candidates = nonempty & (bin_range < last_nonempty[:, None])
+        bin_gains = split_gains(gini[:, None], np.cumsum(left_counts, axis=1), np.cumsum(left_positives, axis=1),
+                                counts[:, None], positives[:, None], self.min_split_points)
+        bin_gains[~candidates] = -np.inf
+        best = np.argmax(bin_gains, axis=1)
+        following = np.argmax(nonempty & (bin_range > best[:, None]), axis=1)
+        thresholds = (bins.upper_values[best] + bins.lower_values[following])/2
+        return bin_gains[np.arange(nb_nodes), best], thresholds
@@ -0,0 +1,188 @@
+from typing import List, Tuple
+
+import copy
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from PointSet import PointSet, FeaturesTypes
+
+class SharedArray:
+    """A NumPy array stored in shared memory, visible from other processes
+
+    Attributes
+    ----------
+        array : np.array
+            The array, backed by the shared memory.
+        spec : Tuple[str, Tuple[int], str, str]
+            What another process needs to attach the array: the name of
+            the shared memory block, the shape, the dtype and the order
+            of the array. It is small and cheap to pickle.
+    """
+    def __init__(self, array: np.ndarray, order: str = 'C'):
+        """
+        Parameters
+        ----------
+        array : np.array
+            The array to copy into shared memory.
+        order : str
+            'C' or 'F', the memory layout of the shared copy.
+        """
+        array = np.asarray(array)
+        self._memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.array = np.ndarray(array.shape, dtype=array.dtype, buffer=self._memory.buf, order=order)
+        self.array[...] = array
+        self.spec = (self._memory.name, array.shape, array.dtype.str, order)
+
+    def release(self) -> None:
+        """Free the shared memory; the array must not be used anymore"""
+        self.array = None
+        self._memory.close()
+        self._memory.unlink()
+
+# the shared memory blocks attached by the current process, by name
+_attached = {}
+
+def attach(spec: Tuple[str, Tuple[int], str, str]) -> np.ndarray:
+    """Get, without copy, an array shared by another process
+
+    Parameters
+    ----------
+        spec : Tuple[str, Tuple[int], str, str]
+            The `spec` attribute of the SharedArray.
+
+    Returns
+    -------
+        np.array
+            A view of the shared array. The block stays attached for
+            the lifetime of the process.
+    """
+    name, shape, dtype, order = spec
+    if name not in _attached:
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=_attached[name].buf, order=order)
+
+def _process_feature_split(features_spec: Tuple,
+                           labels_spec: Tuple,
+                           types: List[FeaturesTypes],
+                           min_split_points: int,
+                           classes_split: str,
+                           indices: np.ndarray,
+                           j: int,
+                           gini: float,
+                           sorted_indices: np.ndarray,
+                           histogram: Tuple) -> Tuple[float, float]:
+    """Score the splits along the feature `j` in a worker process"""
+    points = PointSet(attach(features_spec), attach(labels_spec), types, indices,
+                      None if sorted_indices is None else {j: sorted_indices},
+                      None if histogram is None else {j: histogram})
+    points.add_min_split_points(min_split_points)
+    points.classes_split = classes_split
+    return points.get_feature_split(j, gini)
+
+class FeatureExecutor:
+    """Scores the splits of a set of points along each feature concurrently
+
+    With threads, the features are scored in parallel where the NumPy
+    kernels release the GIL (sorting, counting). With processes, the
+    training points are copied once into shared memory, and each task
+    only carries the indices of the points of the node.
+
+    Attributes
+    ----------
+        features : np.array[float]
+            The training features, to be used by the point sets given
+            to `get_feature_splits` (shared in process mode).
+        labels : np.array[bool]
+            The training labels, likewise.
+        min_parallel_points : int
+            The sets with fewer points are scored in the calling thread,
+            where the scheduling overhead would exceed the gain.
+    """
+    def __init__(self,
+                 features: np.ndarray,
+                 labels: np.ndarray,
+                 workers: int,
+                 kind: str = 'thread',
+                 min_parallel_points: int = 4096):
+        """
+        Parameters
+        ----------
+        features : np.array[float]
+            2D array containing the features of all the training points.
+        labels : np.array[bool]
+            The labels of all the training points.
+        workers : int
+            The number of threads or processes.
+        kind : str
+            'thread' or 'process'.
+        min_parallel_points : int
+            The minimum number of points of a set to score its features
+            in parallel.
+        """
+        self.kind = kind
+        self.min_parallel_points = min_parallel_points
+        self._shared = []
+        if kind == 'thread':
+            self.features = features
+            self.labels = labels
+            self._pool = ThreadPoolExecutor(workers)
+        elif kind == 'process':
+            self._shared = [SharedArray(features, order='F'), SharedArray(labels)]
+            self.features = self._shared[0].array
+            self.labels = self._shared[1].array
+            self._pool = ProcessPoolExecutor(workers)
+        else:
+            raise ValueError(f'Unknown executor kind : {kind}')
+
+    def get_feature_splits(self,
+                           points: PointSet,
+                           gini: float,
+                           feature_ids: List[int] = None) -> List[Tuple[float, float]]:
+        """Compute the best split of a set of points along each of its features
+
+        Parameters
+        ----------
+            points : PointSet
+                The set of points, whose features and labels should be
+                the `features` and `labels` of the executor.
+            gini : float
+                The Gini score of the set.
+            feature_ids : List[int]
+                The features to score, or None for all of them.
+
+        Returns
+        -------
+            List[Tuple[float, float]]
+                The result of `points.get_feature_split` for each
+                feature, in order.
+        """
+        if feature_ids is None:
+            feature_ids = range(points.features.shape[1])
+        if len(points.labels) < self.min_parallel_points:
+            return [points.get_feature_split(j, gini) for j in feature_ids]
+        if self.kind == 'thread':
+            return list(self._pool.map(lambda j: points.get_feature_split(j, gini), feature_ids))
+
+        indices = points.indices if points.indices is not None else np.arange(len(points.labels))
+        futures = []
+        for j in feature_ids:
+            sorted_indices = points.sorted_indices.get(j) if points.sorted_indices is not None else None
+            histogram = points.histograms.get(j) if points.histograms is not None else None
+            if histogram is not None:
+                # the worker only needs the bin bounds, not the codes of all the points
+                bins = copy.copy(histogram[0])
+                bins.codes = None
+                histogram = (bins, *histogram[1:])
+            futures.append(self._pool.submit(_process_feature_split,
+                                             self._shared[0].spec, self._shared[1].spec,
+                                             points.types, points.min_split_points,
+                                             points.classes_split, indices, j, gini, sorted_indices, histogram))
+        return [future.result() for future in futures]
+
+    def shutdown(self) -> None:
+        """Stop the workers and free the shared memory"""
+        self._pool.shutdown()
+        for shared in self._shared:
+            shared.release()
+        self._shared = []
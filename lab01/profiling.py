@@ -0,0 +1,156 @@
+from typing import Dict, List
+
+import time
+
+from PointSet import FeaturesTypes
+
+class NodeProfile:
+    """What the construction of one node of a Tree cost
+
+    Attributes
+    ----------
+        depth : int
+            The depth of the node.
+        nb_points : int
+            The number of training points of the node.
+        time : float
+            The wall time spent building the node (searching its split
+            and partitioning its points), its children excluded, in
+            seconds.
+        nb_features : Dict[FeaturesTypes, int]
+            The number of features scanned, by type.
+        nb_candidates : Dict[FeaturesTypes, int]
+            The number of candidate splits evaluated, by feature type.
+        feature_time : Dict[FeaturesTypes, float]
+            The wall time spent scanning the features, by type.
+        allocated_bytes : int
+            The size of the arrays allocated to partition the points
+            between the children (indices, sorted indices, histograms).
+        children : List[NodeProfile]
+            The profiles of the children, if the node was split.
+    """
+    __slots__ = ('depth', 'nb_points', 'time', 'nb_features', 'nb_candidates',
+                 'feature_time', 'allocated_bytes', 'children', '_start')
+
+    def __init__(self, depth: int, nb_points: int):
+        self.depth = depth
+        self.nb_points = nb_points
+        self.time = 0.
+        self.nb_features = dict.fromkeys(FeaturesTypes, 0)
+        self.nb_candidates = dict.fromkeys(FeaturesTypes, 0)
+        self.feature_time = dict.fromkeys(FeaturesTypes, 0.)
+        self.allocated_bytes = 0
+        self.children = []
+        self._start = time.perf_counter()
+
+    def add_feature(self, feature_type: FeaturesTypes, duration: float) -> None:
+        self.nb_features[feature_type] += 1
+        self.feature_time[feature_type] += duration
+
+    def add_candidates(self, feature_type: FeaturesTypes, nb_candidates: int) -> None:
+        self.nb_candidates[feature_type] += nb_candidates
+
+    def to_dict(self) -> Dict:
+        """Export the profile of the node and of its descendants as nested dicts"""
+        return {'depth': self.depth,
+                'nb_points': self.nb_points,
+                'time': self.time,
+                'nb_features': {feature_type.name: n for feature_type, n in self.nb_features.items()},
+                'nb_candidates': {feature_type.name: n for feature_type, n in self.nb_candidates.items()},
+                'feature_time': {feature_type.name: t for feature_type, t in self.feature_time.items()},
+                'allocated_bytes': self.allocated_bytes,
+                'children': [child.to_dict() for child in self.children]}
+
+class TrainingProfiler:
+    """Records the cost of each node while a Tree is built
+
+    It is given to Tree through its `profiler` parameter. Without it,
+    the construction only pays one test per node and per feature.
+
+    The features are only broken down by type when they are scored in
+    the calling process (or by the thread executor), not by the
+    process executor.
+
+    Attributes
+    ----------
+        roots : List[NodeProfile]
+            The profile of the root of each tree built with this
+            profiler.
+    """
+    def __init__(self):
+        self.roots = []
+        self._parents = []
+        self._last = None
+
+    def start_node(self, nb_points: int) -> NodeProfile:
+        """Open the profile of a node, as a child of the node being expanded"""
+        profile = NodeProfile(len(self._parents), nb_points)
+        if self._parents:
+            self._parents[-1].children.append(profile)
+        else:
+            self.roots.append(profile)
+        self._last = profile
+        return profile
+
+    def end_node(self, profile: NodeProfile) -> None:
+        profile.time = time.perf_counter() - profile._start
+
+    def descend(self) -> None:
+        """Make the last node started the parent of the next ones"""
+        self._parents.append(self._last)
+
+    def ascend(self) -> None:
+        self._parents.pop()
+
+    def iter_nodes(self) -> List[NodeProfile]:
+        nodes = []
+        stack = list(reversed(self.roots))
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack += reversed(node.children)
+        return nodes
+
+    def get_report(self) -> List[Dict]:
+        """Export the profiles as one nested dict per tree"""
+        return [root.to_dict() for root in self.roots]
+
+    def get_counters(self) -> Dict[str, float]:
+        """Sum the profiles of all the nodes into flat counters
+
+        Returns
+        -------
+            Dict[str, float]
+                The number of nodes, the total time, points, allocated
+                bytes, and the features scanned, candidates evaluated
+                and scanning time of each feature type.
+        """
+        counters = {'nodes': 0, 'time': 0., 'points': 0, 'allocated_bytes': 0}
+        for feature_type in FeaturesTypes:
+            name = feature_type.name.lower()
+            counters[f'{name}_features'] = 0
+            counters[f'{name}_candidates'] = 0
+            counters[f'{name}_time'] = 0.
+        for node in self.iter_nodes():
+            counters['nodes'] += 1
+            counters['time'] += node.time
+            counters['points'] += node.nb_points
+            counters['allocated_bytes'] += node.allocated_bytes
+            for feature_type in FeaturesTypes:
+                name = feature_type.name.lower()
+                counters[f'{name}_features'] += node.nb_features[feature_type]
+                counters[f'{name}_candidates'] += node.nb_candidates[feature_type]
+                counters[f'{name}_time'] += node.feature_time[feature_type]
+        return counters
+
+    def format_report(self) -> str:
+        """Format the profiles as an indented tree, followed by the counters"""
+        lines = []
+        for node in self.iter_nodes():
+            candidates = ', '.join(f'{feature_type.name.lower()} {node.nb_candidates[feature_type]}'
+                                   for feature_type in FeaturesTypes if node.nb_features[feature_type])
+            lines.append(f'{"  "*node.depth}node: {node.nb_points} points, {node.time*1e3:.3f} ms, '
+                         f'{sum(node.nb_features.values())} features, candidates ({candidates}), '
+                         f'{node.allocated_bytes} bytes')
+        lines += [f'{name}: {value:.6g}' for name, value in self.get_counters().items()]
+        return '\n'.join(lines)
@@ -1,7 +1,22 @@
-from typing import Tuple, List
+from typing import Dict, Iterator, Tuple, List
 
 import csv
+import itertools
+import json
+import os
+import struct
+
+import numpy as np
 from PointSet import FeaturesTypes
+from Dataset import Dataset
+from CompiledTree import CompiledTree
+
+CACHE_SUFFIX = '.colcache'
+CACHE_MAGIC = b'SD201COL'
+CACHE_VERSION = 1
+MODEL_MAGIC = b'SD201MDL'
+MODEL_VERSION = 1
+_ALIGNMENT = 64
 
 def load_data(file_name: str) -> Tuple[List[List[float]], List[bool], List[FeaturesTypes]]:
     """Read the content of the file.
@@ -39,26 +54,430 @@ def load_data(file_name: str) -> Tuple[List[List[float]], List[bool], List[Featu
         csv_reader = csv.reader(csv_file, delimiter=',')
         labels = []
         features = []
-        features_types = []
-        label_id = -1
-        for i, datum in enumerate(next(csv_reader)):
-            if datum=='l':
-                label_id = i
-            elif datum=='b':
-                features_types += [FeaturesTypes.BOOLEAN]
-            elif datum=='c':
-                features_types += [FeaturesTypes.CLASSES]
-            elif datum=='r':
-                features_types += [FeaturesTypes.REAL]
-            else:
-                raise NotImplementedError(f'Unknown data type header : {datum}')
-        if label_id < 0:
-            raise Exception('Label ID not found in file header')
+        label_id, features_types = parse_header(next(csv_reader))
         for line in csv_reader:
             labels += [line[label_id]=='1']
             features += [[float(val) for i, val in enumerate(line) if i != label_id]]
     return features, labels, features_types
 
+def parse_header(header: List[str]) -> Tuple[int, List[FeaturesTypes]]:
+    """Read the types line of a data file
+
+    Parameters
+    ----------
+        header : List[str]
+            The cells of the first line of the file.
+
+    Returns
+    -------
+        int
+            The index of the column containing the labels.
+        List[FeaturesTypes]
+            The types of the features, in the order of the columns.
+    """
+    features_types = []
+    label_id = -1
+    for i, datum in enumerate(header):
+        if datum=='l':
+            label_id = i
+        elif datum=='b':
+            features_types += [FeaturesTypes.BOOLEAN]
+        elif datum=='c':
+            features_types += [FeaturesTypes.CLASSES]
+        elif datum=='r':
+            features_types += [FeaturesTypes.REAL]
+        else:
+            raise NotImplementedError(f'Unknown data type header : {datum}')
+    if label_id < 0:
+        raise Exception('Label ID not found in file header')
+    return label_id, features_types
+
+def read_types(file_name: str) -> List[FeaturesTypes]:
+    """Read the types of the features of a data file
+
+    Parameters
+    ----------
+        file_name : str
+            The name or path of the file to read
+
+    Returns
+    -------
+        List[FeaturesTypes]
+            The types of the features.
+    """
+    with open(file_name) as csv_file:
+        return parse_header(next(csv.reader(csv_file, delimiter=',')))[1]
+
+def iter_chunks(file_name: str, chunk_size: int = 65536) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Read the points of a data file by chunks of bounded size
+
+    The file has the format described in `load_data`. At most
+    `chunk_size` lines of the file are held in memory at once.
+
+    Parameters
+    ----------
+        file_name : str
+            The name or path of the file to read
+        chunk_size : int
+            The number of lines read per chunk.
+
+    Yields
+    ------
+        np.array[float]
+            2D array containing the features of the points of the
+            chunk, as in `load_data`.
+        np.array[bool]
+            The labels of the points of the chunk.
+    """
+    with open(file_name) as csv_file:
+        label_id, features_types = parse_header(next(csv.reader([csv_file.readline()], delimiter=',')))
+        feature_ids = [i for i in range(len(features_types) + 1) if i != label_id]
+        while True:
+            lines = list(itertools.islice(csv_file, chunk_size))
+            if not lines:
+                return
+            features = np.loadtxt(lines, delimiter=',', usecols=feature_ids, ndmin=2)
+            labels = np.loadtxt(lines, dtype=str, delimiter=',', usecols=[label_id], ndmin=1) == '1'
+            yield features.reshape(len(labels), len(features_types)), labels
+
+def load_dataset(file_name: str, use_cache: bool = True, chunk_size: int = None) -> Dataset:
+    """Read the content of the file as typed columns, through a binary cache
+
+    The file has the format described in `load_data`. The first time
+    it is read, its columns are stored into a sidecar binary file
+    (`file_name` + CACHE_SUFFIX). Later reads memory-map this cache
+    instead of parsing the csv file, as long as the size and the
+    modification time of the csv file did not change. If the cache
+    cannot be written, the parsed points are returned all the same.
+
+    Parameters
+    ----------
+        file_name : str
+            The name or path of the csv file to read
+        use_cache : bool
+            If False, the csv file is parsed and no cache is written.
+        chunk_size : int
+            If not None, a missing or stale cache is built by streaming
+            the csv file in chunks of `chunk_size` lines, then mapped,
+            so files larger than the memory can be loaded.
+
+    Returns
+    -------
+        Dataset
+            The points of the file. When read from the cache, the
+            columns are read-only views of the mapped file.
+    """
+    cache_name = file_name + CACHE_SUFFIX
+    if use_cache:
+        dataset = _read_cache(file_name, cache_name)
+        if dataset is not None:
+            return dataset
+        if chunk_size is not None:
+            # the cache is only an optimization: if it cannot be written
+            # (read-only directory, full disk...), the file is parsed
+            try:
+                _write_cache_by_chunks(file_name, cache_name, chunk_size)
+            except OSError:
+                pass
+            else:
+                dataset = _read_cache(file_name, cache_name)
+                if dataset is not None:
+                    return dataset
+
+    with open(file_name) as csv_file:
+        label_id, features_types = parse_header(next(csv.reader(csv_file, delimiter=',')))
+    feature_ids = [i for i in range(len(features_types) + 1) if i != label_id]
+    # numpy's parser is much faster than converting every cell with float()
+    features = np.loadtxt(file_name, delimiter=',', skiprows=1, usecols=feature_ids, ndmin=2)
+    labels = np.loadtxt(file_name, dtype=str, delimiter=',', skiprows=1, usecols=[label_id], ndmin=1) == '1'
+    dataset = Dataset.from_arrays(features, labels, features_types)
+
+    if use_cache:
+        try:
+            _write_cache(file_name, cache_name, dataset)
+        except OSError:
+            pass
+    return dataset
+
+def _source_signature(file_name: str) -> Dict[str, int]:
+    stat = os.stat(file_name)
+    return {'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns}
+
+def _write_cache(file_name: str, cache_name: str, dataset: Dataset) -> None:
+    """Store the columns of a dataset read from `file_name` into `cache_name`"""
+    arrays = {f'column{j}': column for j, column in enumerate(dataset.columns)}
+    arrays.update({f'categories{j}': values for j, values in dataset.categories.items()})
+    arrays['labels'] = dataset.label_bits
+    header = {'version': CACHE_VERSION,
+              'nb_points': dataset.nb_points,
+              'types': [feature_type.name for feature_type in dataset.types]}
+    header.update(_source_signature(file_name))
+    write_arrays(cache_name, CACHE_MAGIC, header, arrays)
+
+def _write_cache_by_chunks(file_name: str, cache_name: str, chunk_size: int) -> None:
+    """Store the columns of `file_name` into `cache_name` without loading the whole file
+
+    A first pass over the file counts the points and collects the
+    categories; the second one writes each chunk at its place in the
+    memory-mapped cache.
+    """
+    features_types = read_types(file_name)
+    nb_points = 0
+    categories = {j: np.empty(0) for j, feature_type in enumerate(features_types)
+                  if feature_type == FeaturesTypes.CLASSES}
+    for features, labels in iter_chunks(file_name, chunk_size):
+        nb_points += len(labels)
+        for j in categories:
+            categories[j] = np.union1d(categories[j], features[:, j])
+
+    specs = {}
+    for j, feature_type in enumerate(features_types):
+        dtype = Dataset.get_column_dtype(feature_type, categories.get(j))
+        specs[f'column{j}'] = (dtype, (nb_points,))
+    specs.update({f'categories{j}': (np.float64, values.shape) for j, values in categories.items()})
+    specs['labels'] = (np.uint8, ((nb_points + 7)//8,))
+    header = {'version': CACHE_VERSION,
+              'nb_points': nb_points,
+              'types': [feature_type.name for feature_type in features_types]}
+    header.update(_source_signature(file_name))
+
+    temporary_name = f'{cache_name}.{os.getpid()}.tmp'
+    try:
+        arrays = create_arrays(temporary_name, CACHE_MAGIC, header, specs)
+        for j, values in categories.items():
+            arrays[f'categories{j}'][:] = values
+        start = 0
+        # labels are packed 8 by 8, the remainder waits for the next chunk
+        pending_labels = np.empty(0, dtype=bool)
+        for features, labels in iter_chunks(file_name, chunk_size):
+            end = start + len(labels)
+            for j, feature_type in enumerate(features_types):
+                arrays[f'column{j}'][start:end] = Dataset.encode_column(feature_type, features[:, j],
+                                                                        categories.get(j))
+            pending_labels = np.concatenate((pending_labels, labels))
+            nb_packed = len(pending_labels)//8*8
+            packed_start = (end - len(pending_labels))//8
+            arrays['labels'][packed_start:packed_start + nb_packed//8] = np.packbits(pending_labels[:nb_packed])
+            pending_labels = pending_labels[nb_packed:]
+            start = end
+        if len(pending_labels):
+            arrays['labels'][-1] = np.packbits(pending_labels)[0]
+        _flush_arrays(arrays)
+        del arrays
+        os.replace(temporary_name, cache_name)
+    finally:
+        _remove_temporary(temporary_name)
+
+def _read_cache(file_name: str, cache_name: str) -> Dataset:
+    """Load the cached columns of `file_name`, or None if the cache is missing or stale"""
+    try:
+        header, arrays = read_arrays(cache_name, CACHE_MAGIC)
+    except (OSError, ValueError):
+        return None
+    if header.get('version') != CACHE_VERSION:
+        return None
+    if any(header.get(key) != value for key, value in _source_signature(file_name).items()):
+        return None
+
+    types = [FeaturesTypes[name] for name in header['types']]
+    columns = [arrays[f'column{j}'] for j in range(len(types))]
+    categories = {j: arrays[f'categories{j}'] for j, feature_type in enumerate(types)
+                  if feature_type == FeaturesTypes.CLASSES}
+    return Dataset(columns, categories, arrays['labels'], header['nb_points'], types)
+
+def _align(offset: int) -> int:
+    return -(-offset//_ALIGNMENT)*_ALIGNMENT
+
+def _view(content: np.ndarray, data_start: int, spec: Dict) -> np.ndarray:
+    """Interpret a part of the bytes of a file as one of its arrays"""
+    dtype = np.dtype(spec['dtype'])
+    shape = tuple(spec['shape'])
+    start = data_start + spec['offset']
+    nbytes = int(np.prod(shape, dtype=np.int64))*dtype.itemsize
+    return content[start:start + nbytes].view(dtype).reshape(shape)
+
+def create_arrays(file_name: str, magic: bytes, header: Dict, specs: Dict[str, Tuple]) -> Dict[str, np.ndarray]:
+    """Create a raw binary file of arrays described by a JSON header, to be filled in place
+
+    The file starts with the 8 bytes `magic`, the length of the header
+    as a little-endian uint64 and the JSON header. The arrays follow,
+    each one aligned on 64 bytes, so that they can be memory-mapped.
+
+    Parameters
+    ----------
+        file_name : str
+            The name or path of the file to create.
+        magic : bytes
+            8 bytes identifying the kind of file.
+        header : Dict
+            JSON-serializable metadata stored along with the arrays.
+        specs : Dict[str, Tuple[dtype, Tuple[int]]]
+            The dtype and shape of each array.
+
+    Returns
+    -------
+        Dict[str, np.array]
+            The arrays of the file, memory-mapped for writing. They are
+            saved on disk once flushed or garbage-collected.
+    """
+    layout = {}
+    offset = 0
+    for name, (dtype, shape) in specs.items():
+        dtype = np.dtype(dtype)
+        layout[name] = {'dtype': dtype.str, 'shape': list(shape), 'offset': offset}
+        offset = _align(offset + int(np.prod(shape, dtype=np.int64))*dtype.itemsize)
+    encoded_header = json.dumps(dict(header, arrays=layout)).encode()
+    data_start = _align(len(magic) + 8 + len(encoded_header))
+
+    with open(file_name, 'wb') as dest_file:
+        dest_file.write(magic + struct.pack('<Q', len(encoded_header)) + encoded_header)
+        dest_file.truncate(data_start + offset)
+    content = np.memmap(file_name, dtype=np.uint8, mode='r+')
+    return {name: _view(content, data_start, spec) for name, spec in layout.items()}
+
+def _flush_arrays(arrays: Dict[str, np.ndarray]) -> None:
+    """Save on disk the arrays returned by `create_arrays`"""
+    # the views of empty arrays are plain arrays; the other ones share the
+    # memory map of the file, so flushing one of them flushes the file
+    for array in arrays.values():
+        if isinstance(array, np.memmap):
+            array.flush()
+            return
+
+def _remove_temporary(temporary_name: str) -> None:
+    """Remove a temporary file left by a failed write, if any"""
+    try:
+        os.remove(temporary_name)
+    except FileNotFoundError:
+        pass
+
+def write_arrays(file_name: str, magic: bytes, header: Dict, arrays: Dict[str, np.ndarray]) -> None:
+    """Write named arrays into a raw binary file described by a JSON header
+
+    The format is the one of `create_arrays`. The file is written under
+    a temporary name and then renamed, so a reader never sees it half
+    written.
+
+    Parameters
+    ----------
+        file_name : str
+            The name or path of the file to write.
+        magic : bytes
+            8 bytes identifying the kind of file.
+        header : Dict
+            JSON-serializable metadata stored along with the arrays.
+        arrays : Dict[str, np.array]
+            The arrays to store.
+    """
+    temporary_name = f'{file_name}.{os.getpid()}.tmp'
+    specs = {name: (np.asarray(array).dtype, np.shape(array)) for name, array in arrays.items()}
+    try:
+        destinations = create_arrays(temporary_name, magic, header, specs)
+        for name, array in arrays.items():
+            destinations[name][...] = array
+        _flush_arrays(destinations)
+        del destinations
+        os.replace(temporary_name, file_name)
+    finally:
+        _remove_temporary(temporary_name)
+
+def read_arrays(file_name: str, magic: bytes, mmap: bool = True) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """Read a file written by `create_arrays` or `write_arrays`
+
+    Parameters
+    ----------
+        file_name : str
+            The name or path of the file to read.
+        magic : bytes
+            The 8 bytes the file should start with.
+        mmap : bool
+            If True, the arrays are read-only views of the memory-mapped
+            file, so nothing is copied until they are used. Otherwise
+            the whole file is read in memory.
+
+    Returns
+    -------
+        Dict
+            The header of the file.
+        Dict[str, np.array]
+            The arrays stored in the file.
+    """
+    with open(file_name, 'rb') as source_file:
+        if source_file.read(len(magic)) != magic:
+            raise ValueError(f'{file_name} is not a {magic!r} file')
+        header_length = struct.unpack('<Q', source_file.read(8))[0]
+        header = json.loads(source_file.read(header_length))
+        data_start = _align(len(magic) + 8 + header_length)
+        if mmap:
+            content = np.memmap(source_file, dtype=np.uint8, mode='r')
+        else:
+            source_file.seek(0)
+            content = np.frombuffer(source_file.read(), dtype=np.uint8)
+
+    arrays = {name: _view(content, data_start, spec) for name, spec in header.pop('arrays').items()}
+    return header, arrays
+
+def save_model(model, file_name: str) -> None:
+    """Save a trained tree into a binary model file
+
+    Only the flattened arrays of the tree (see CompiledTree), including
+    the categories of its subset splits, and the types of its features
+    are stored, so the size of the file only depends on the number of
+    nodes.
+
+    Parameters
+    ----------
+        model : Tree or CompiledTree
+            The tree to save.
+        file_name : str
+            The name or path of the file to write.
+    """
+    types = model.types
+    compiled = model.compile() if hasattr(model, 'compile') else model
+    header = {'version': MODEL_VERSION,
+              'types': None if types is None else [feature_type.name for feature_type in types],
+              'depth': compiled.depth}
+    arrays = {'feature': compiled.feature,
+              'kind': compiled.kind,
+              'threshold': compiled.threshold,
+              'left': compiled.left,
+              'right': compiled.right,
+              'value': compiled.value,
+              'categories': compiled.categories,
+              'category_offsets': compiled.category_offsets}
+    write_arrays(file_name, MODEL_MAGIC, header, arrays)
+
+def load_model(file_name: str, mmap: bool = True) -> CompiledTree:
+    """Load a tree saved by `save_model`
+
+    No Python object is built per node: the arrays of the returned tree
+    are views of the memory-mapped file, so loading takes the same time
+    whatever the size of the training set, and the pages of the file
+    are only read when predictions need them.
+
+    Parameters
+    ----------
+        file_name : str
+            The name or path of the model file.
+        mmap : bool
+            If False, the file is read in memory instead.
+
+    Returns
+    -------
+        CompiledTree
+            The tree, ready for `decide` and `decide_batch`.
+    """
+    header, arrays = read_arrays(file_name, MODEL_MAGIC, mmap)
+    if header['version'] != MODEL_VERSION:
+        raise ValueError(f'Unsupported model version {header["version"]} in {file_name}')
+    types = None
+    if header['types'] is not None:
+        types = [FeaturesTypes[name] for name in header['types']]
+    return CompiledTree(arrays['feature'], arrays['kind'], arrays['threshold'],
+                        arrays['left'], arrays['right'], arrays['value'],
+                        arrays['categories'], arrays['category_offsets'],
+                        depth=header['depth'], types=types)
+
 def format_result(result) -> str:
     """Format a result into an unambiguous string
 
@@ -0,0 +1,374 @@
+"""Serve the predictions of a saved tree, gathering concurrent requests into batches
+
+Usage: python serving.py model_file [--host HOST] [--port PORT] [--batch-size N]
+                         [--max-delay SECONDS] [--reload-interval SECONDS]
+
+The protocol is one JSON object per line, in both directions:
+    {"id": 1, "features": [0, 3.5, 1]}  ->  {"id": 1, "label": true}
+    {"id": 2, "stats": true}            ->  {"id": 2, "stats": {...}}
+Requests failing are answered by {"id": ..., "error": "..."}. The
+answers of a connection come in the order in which their batches are
+scored, so a client can have many requests in flight on one connection.
+"""
+from typing import Dict, List, Tuple
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from CompiledTree import CompiledTree, LEAF
+from read_write import load_model
+
+def _get_nb_features(model: CompiledTree) -> Tuple[int, bool]:
+    """The number of features of the points scored by a tree
+
+    Returns
+    -------
+        int
+            The number of features of the tree if its types are known,
+            otherwise the number of features it reads.
+        bool
+            Whether the points must have exactly this number of
+            features, rather than at least this number.
+    """
+    if model.types is not None:
+        return len(model.types), True
+    inner_nodes = model.feature[model.feature != LEAF]
+    return (int(inner_nodes.max()) + 1 if len(inner_nodes) else 0), False
+
+class ScoringServer:
+    """Scores single points with a saved tree, in micro-batches
+
+    The requests wait in a queue; a batch is scored as soon as it holds
+    `max_batch_size` points, or `max_delay` seconds after its first
+    point arrived, with one vectorized call to the tree. The awaiting
+    requests are then resolved.
+
+    The model file is watched: when it changes, the new tree replaces
+    the old one between two batches, so no request in flight is
+    dropped. A file which cannot be read (for instance while it is being
+    written) is ignored until its next change; writing the new model
+    next to the old one and renaming it over it avoids this.
+
+    Attributes
+    ----------
+        model : CompiledTree
+            The tree scoring the next batch.
+        max_batch_size : int
+            The maximum number of points of a batch.
+        max_delay : float
+            The longest time a request waits for its batch to fill, in
+            seconds.
+    """
+    def __init__(self,
+                 model_file: str,
+                 max_batch_size: int = 256,
+                 max_delay: float = .002,
+                 reload_interval: float = 1.,
+                 latency_window: int = 10000):
+        """
+        Parameters
+        ----------
+            model_file : str
+                The model file, written by `read_write.save_model`.
+            max_batch_size : int
+                The maximum number of points of a batch.
+            max_delay : float
+                The longest time a request waits for its batch to fill.
+            reload_interval : float
+                How often the model file is checked for changes, in
+                seconds, or None to only reload it through `reload`.
+            latency_window : int
+                The number of most recent requests from which the
+                latency percentiles are computed.
+        """
+        self.model_file = model_file
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.reload_interval = reload_interval
+        self.model = None
+        self._model_stamp = None
+        self.reload()
+        self._queue = None
+        self._tasks = []
+        self._latencies = collections.deque(maxlen=latency_window)
+        self._counters = {'requests': 0, 'batches': 0, 'errors': 0, 'reloads': 0, 'reload_errors': 0}
+        self._start_time = time.perf_counter()
+
+    def _get_stamp(self):
+        status = os.stat(self.model_file)
+        return status.st_mtime_ns, status.st_size, status.st_ino
+
+    def reload(self) -> bool:
+        """Load the model file again if it changed since it was last loaded
+
+        Returns
+        -------
+            bool
+                Whether a new tree was loaded.
+        """
+        stamp = self._get_stamp()
+        if stamp == self._model_stamp:
+            return False
+        # read in memory: a file rewritten in place would change the pages of a mapped one
+        model = load_model(self.model_file, mmap=False)
+        self.model, self._model_stamp = model, stamp
+        return True
+
+    async def start(self) -> None:
+        """Start scoring the queued requests (and watching the model file)"""
+        self._queue = asyncio.Queue()
+        self._start_time = time.perf_counter()
+        self._tasks = [asyncio.create_task(self._score_batches())]
+        if self.reload_interval is not None:
+            self._tasks.append(asyncio.create_task(self._watch_model()))
+
+    async def stop(self) -> None:
+        """Score the requests already queued, then stop"""
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def __aenter__(self) -> 'ScoringServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def decide(self, features: List[float]) -> bool:
+        """Give the guessed label of the tree to an unlabeled point
+
+        Parameters
+        ----------
+            features : List[float]
+                The features of the unlabeled point.
+
+        Returns
+        -------
+            bool
+                The label of the point, guessed by the tree.
+        """
+        if self._queue is None:
+            raise RuntimeError('server not started')
+        features = np.asarray(features, dtype=float)
+        if features.ndim != 1:
+            self._counters['errors'] += 1
+            raise ValueError(f'Expected a list of features, got {features.tolist()}')
+        # the number of features is checked against the tree scoring the batch
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((features, future, time.perf_counter()))
+        return await future
+
+    async def _score_batches(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = batch[0][2] + self.max_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if self._queue.empty():
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+
+            # the tree is read once per batch, so a reload never splits a batch
+            model = self.model
+            nb_features, exact = _get_nb_features(model)
+            valid = []
+            for features, future, start in batch:
+                if len(features) == nb_features or (not exact and len(features) > nb_features):
+                    valid.append((features[:nb_features], future, start))
+                    continue
+                self._counters['errors'] += 1
+                if not future.done():
+                    future.set_exception(ValueError(f'Expected {nb_features}{"" if exact else " or more"} '
+                                                    f'features, got {features.tolist()}'))
+            try:
+                labels = []
+                if valid:
+                    labels = model.decide_batch(np.stack([features for features, _, _ in valid])).tolist()
+            except Exception as error:
+                self._counters['errors'] += len(valid)
+                for _, future, _ in valid:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                end = time.perf_counter()
+                for (_, future, start), label in zip(valid, labels):
+                    self._latencies.append(end - start)
+                    if not future.done():
+                        future.set_result(label)
+                self._counters['requests'] += len(valid)
+            self._counters['batches'] += 1
+            for _ in batch:
+                self._queue.task_done()
+            # let the resolved requests run before the next batch
+            await asyncio.sleep(0)
+
+    async def _watch_model(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                if self.reload():
+                    self._counters['reloads'] += 1
+            except (OSError, ValueError, KeyError):
+                self._counters['reload_errors'] += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        """Read the counters of the server
+
+        Returns
+        -------
+            Dict[str, float]
+                The number of requests scored, of batches, of failed
+                requests and of model reloads, the mean batch size, the
+                throughput since the start (requests per second), and
+                the 50th and 99th percentiles of the latency of the
+                recent requests (in milliseconds, from their arrival to
+                their answer).
+        """
+        stats = dict(self._counters)
+        stats['mean_batch_size'] = stats['requests']/stats['batches'] if stats['batches'] else 0.
+        stats['throughput'] = stats['requests']/max(time.perf_counter() - self._start_time, 1e-9)
+        latencies = np.array(self._latencies)*1e3
+        stats['p50_ms'] = float(np.percentile(latencies, 50)) if len(latencies) else 0.
+        stats['p99_ms'] = float(np.percentile(latencies, 99)) if len(latencies) else 0.
+        return stats
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 0) -> asyncio.AbstractServer:
+        """Accept the requests of local clients on a TCP socket
+
+        Returns
+        -------
+            asyncio.AbstractServer
+                The listening server (its `sockets` give the port when
+                `port` is 0).
+        """
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        pending = set()
+
+        async def answer(request: dict) -> None:
+            response = {'id': request.get('id')}
+            try:
+                if request.get('stats'):
+                    response['stats'] = self.get_stats()
+                else:
+                    response['label'] = await self.decide(request['features'])
+            except Exception as error:
+                response['error'] = f'{type(error).__name__}: {error}'
+            writer.write((json.dumps(response) + '\n').encode())
+
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as error:
+                    writer.write((json.dumps({'id': None, 'error': f'JSONDecodeError: {error}'}) + '\n').encode())
+                    continue
+                task = asyncio.create_task(answer(request))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                # stop reading while too many requests of the connection are in flight
+                while len(pending) >= 4*self.max_batch_size:
+                    await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    await writer.drain()
+            if pending:
+                await asyncio.wait(pending)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+class ScoringClient:
+    """A client of a ScoringServer listening on a socket
+
+    Several requests can be awaited concurrently on the same connection:
+    the answers are matched with their request by ID.
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._next_id = 0
+        self._futures = {}
+        self._reading = asyncio.create_task(self._read_answers())
+
+    @classmethod
+    async def connect(cls, host: str = '127.0.0.1', port: int = 8765) -> 'ScoringClient':
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _request(self, request: dict):
+        request['id'] = self._next_id
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._futures[request['id']] = future
+        self._writer.write((json.dumps(request) + '\n').encode())
+        await self._writer.drain()
+        response = await future
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    async def _read_answers(self) -> None:
+        while line := await self._reader.readline():
+            response = json.loads(line)
+            future = self._futures.pop(response['id'], None)
+            if future is not None and not future.done():
+                future.set_result(response)
+        for future in self._futures.values():
+            future.set_exception(ConnectionError('The server closed the connection'))
+        self._futures.clear()
+
+    async def decide(self, features: List[float]) -> bool:
+        return (await self._request({'features': [float(value) for value in features]}))['label']
+
+    async def get_stats(self) -> Dict[str, float]:
+        return (await self._request({'stats': True}))['stats']
+
+    async def close(self) -> None:
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._reading.cancel()
+        await asyncio.gather(self._reading, return_exceptions=True)
+
+async def _serve_forever(args: argparse.Namespace) -> None:
+    async with ScoringServer(args.model_file, args.batch_size, args.max_delay, args.reload_interval) as server:
+        listener = await server.serve(args.host, args.port)
+        port = listener.sockets[0].getsockname()[1]
+        print(f'Serving {args.model_file} on {args.host}:{port}')
+        async with listener:
+            await listener.serve_forever()
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description='Serve the predictions of a saved tree.')
+    parser.add_argument('model_file')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--max-delay', type=float, default=.002)
+    parser.add_argument('--reload-interval', type=float, default=1.)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve_forever(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,169 @@
+from typing import Dict, List
+
+import multiprocessing
+import traceback
+
+import numpy as np
+from PointSet import FeaturesTypes
+from level_wise import Level, LevelCounter, LevelCounts, LevelWiseGrower
+
+def serve_shard(connection) -> None:
+    """Hold a shard of the training points of a tree, and answer the requests of a ShardPool
+
+    The connection only needs `send` and `recv`: it is one end of a
+    pipe for the local workers, but it could as well be a socket to
+    another machine (`multiprocessing.connection.Client`).
+
+    The requests are tuples whose first item is their name:
+        ('load', *args) builds the LevelCounter of the shard from the
+        arguments of its constructor,
+        ('count', nb_nodes) counts the points of the shard in each node
+        of the current level,
+        ('split', level, left_codes) sends them to the children of
+        their node,
+        ('close',) ends the loop.
+    Each request but the last one is answered by ('ok', result) or by
+    ('error', traceback).
+    """
+    counter = None
+    while True:
+        request, *args = connection.recv()
+        if request == 'close':
+            connection.close()
+            return
+        try:
+            if request == 'load':
+                counter = LevelCounter(*args)
+                result = None
+            elif request == 'count':
+                result = counter.count(*args)
+            elif request == 'split':
+                counter.split(*args)
+                result = None
+            else:
+                raise ValueError(f'Unknown request : {request}')
+        except Exception:
+            connection.send(('error', traceback.format_exc()))
+        else:
+            connection.send(('ok', result))
+
+class ShardPool:
+    """Workers each holding a contiguous shard of the training points of a tree
+
+    It takes the place of the LevelCounter of all the points in
+    `LevelWiseGrower.grow`: each request is sent to every worker, which
+    counts the points of its shard by (node, key), and the counts are
+    added up by the grower's process, which chooses the splits from
+    them and sends them back. The shards are only shipped once; after
+    that, each level only moves the label counts of its nodes.
+
+    The continuous features must be binned, with the same bins for
+    every shard, since the exact scan needs all the values of a node in
+    the same process.
+
+    Attributes
+    ----------
+        connections : List
+            The connection to each worker.
+    """
+    def __init__(self,
+                 grower: LevelWiseGrower,
+                 features: np.ndarray,
+                 labels: np.ndarray,
+                 rows: np.ndarray,
+                 shards: int = 2,
+                 connections: List = None):
+        """
+        Parameters
+        ----------
+        grower : LevelWiseGrower
+            The grower of the tree, which gives the keys of the counts.
+        features : np.array[float]
+            2D array containing the features of all the points.
+        labels : np.array[bool]
+            The labels of all the points.
+        rows : np.array[int]
+            The indices of the training points.
+        shards : int
+            The number of worker processes to start, each with its shard.
+        connections : List
+            If not None, the connections to workers already running
+            `serve_shard` (one shard each), instead of starting local
+            processes.
+        """
+        exact = [j for j, feature_type in enumerate(grower.types)
+                 if feature_type == FeaturesTypes.REAL and j not in grower.edges]
+        if exact:
+            raise ValueError(f'The continuous features {exact} must be binned to be sharded')
+        self._processes = []
+        self.connections = []
+        try:
+            if connections is None:
+                for _ in range(shards):
+                    connection, worker_connection = multiprocessing.Pipe()
+                    process = multiprocessing.Process(target=serve_shard, args=(worker_connection,), daemon=True)
+                    process.start()
+                    worker_connection.close()
+                    self.connections.append(connection)
+                    self._processes.append(process)
+            else:
+                self.connections = list(connections)
+
+            bounds = np.linspace(0, len(rows), len(self.connections) + 1).astype(int)
+            for connection, start, end in zip(self.connections, bounds[:-1], bounds[1:]):
+                shard_rows = rows[start:end]
+                # the shard is copied, so that it can be sent to another machine
+                connection.send(('load', np.asfortranarray(features[shard_rows]), np.asarray(labels)[shard_rows],
+                                 grower.types, np.arange(end - start), grower.categories, grower.edges,
+                                 grower.classes_split, start))
+            self._receive_all()
+        except BaseException:
+            # __exit__ is not reached when the constructor fails
+            self.close()
+            raise
+
+    def _receive_all(self) -> List:
+        """Wait for the answer of every worker to the last request"""
+        results = []
+        for connection in self.connections:
+            status, result = connection.recv()
+            if status == 'error':
+                raise RuntimeError(f'A shard worker failed:\n{result}')
+            results.append(result)
+        return results
+
+    def _broadcast(self, *request) -> List:
+        for connection in self.connections:
+            connection.send(request)
+        return self._receive_all()
+
+    def count(self, nb_nodes: int) -> LevelCounts:
+        level_counts, *others = self._broadcast('count', nb_nodes)
+        for shard_counts in others:
+            level_counts.add(shard_counts)
+        return level_counts
+
+    def find_exact_splits(self, *args) -> None:
+        # every continuous feature is binned
+        pass
+
+    def split(self, level: Level, left_codes: Dict[int, np.ndarray]) -> None:
+        self._broadcast('split', level, left_codes)
+
+    def close(self) -> None:
+        """Stop the workers"""
+        for connection in self.connections:
+            try:
+                connection.send(('close',))
+            except OSError:
+                # the worker is already gone
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join()
+
+    def __enter__(self) -> 'ShardPool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()